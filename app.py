@@ -1,21 +1,32 @@
 from pathlib import Path
+import click
 from flask import Flask, send_from_directory
 import os
 from dotenv import load_dotenv
 
-from db.schema import init_db, migrate_db
+from db.connection import get_db, init_app as init_db_app
+from db.queries import get_item_aliases, set_item_alias
+from db.schema import check_box_stats, check_query_plans, rebuild_box_stats, run_migrations
 from routes.boxes import bp as boxes_bp
+from routes.export import bp as export_bp
 from routes.search import bp as search_bp
-from storage_s3 import assert_identity
+from services.cache import lookup_cache
+from services.export import FORMATS as EXPORT_FORMATS, export_inventory, gzip_chunks
+from services.ingest import IMPORT_BATCH_SIZE, IMPORT_WORKERS, import_directory
+from services.jobs import start_workers
+from services.metrics import init_app as init_metrics
+from storage_s3 import check_identity_in_background
 
 from routes.main import main_bp
 
 def create_app():
     load_dotenv()
     app = Flask(__name__)
-    assert_identity()
+    # STS runs off the boot path; /healthz reports (and refreshes) the result
+    check_identity_in_background()
     app.secret_key = os.getenv("FLASK_SECRET", "dev-secret")
-    app.config["MAX_CONTENT_LENGTH"] = 20 * 1024 * 1024  # 20 MB
+    # per request; the new-box page splits big multi-photo batches to fit
+    app.config["MAX_CONTENT_LENGTH"] = int(os.getenv("MAX_UPLOAD_MB", "20")) * 1024 * 1024
 
     base_dir = Path(__file__).resolve().parent
     (base_dir / "uploads").mkdir(exist_ok=True)
@@ -28,13 +39,107 @@ def create_app():
     # ----------------------------------------------------
 
     # DB + blueprints
-    init_db()
-    migrate_db()
+    init_db_app(app)
+    init_metrics(app)
+    run_migrations()
     app.register_blueprint(boxes_bp)
     app.register_blueprint(search_bp)
+    app.register_blueprint(export_bp)
     app.register_blueprint(main_bp)
+
+    @app.cli.command("check-query-plans")
+    def check_query_plans_cmd():
+        """Fail if a hot query stopped using its index."""
+        problems = check_query_plans()
+        for p in problems:
+            print("NOT INDEXED:", p)
+        if problems:
+            raise SystemExit(1)
+        print("All hot queries use indexes.")
+
+    @app.cli.command("import-photos")
+    @click.argument("directory", required=False, type=click.Path(exists=True, file_okay=False, path_type=Path))
+    @click.option("--workers", default=IMPORT_WORKERS, show_default=True, help="Photos analyzed at once.")
+    @click.option("--batch-size", default=IMPORT_BATCH_SIZE, show_default=True, help="Boxes per DB transaction.")
+    def import_photos_cmd(directory, workers, batch_size):
+        """Create a box per photo under DIRECTORY (default: uploads/). Safe to re-run."""
+        stats = import_directory(directory or base_dir / "uploads", workers=workers, batch_size=batch_size,
+                                 progress=click.echo)
+        click.echo(f"Done: {stats['imported']} imported, {stats['skipped']} skipped, {stats['failed']} failed "
+                   f"in {stats['elapsed_s']}s ({stats['boxes_per_min']} boxes/min).")
+        if stats["failed"]:
+            raise SystemExit(1)
+
+    @app.cli.command("item-alias")
+    @click.argument("alias", required=False)
+    @click.argument("canonical", required=False)
+    @click.option("--remove", is_flag=True, help="Delete ALIAS instead of setting it.")
+    def item_alias_cmd(alias, canonical, remove):
+        """Map ALIAS to CANONICAL item name (no args: list aliases) and re-normalize items."""
+        if alias and (canonical or remove):
+            changed = set_item_alias(alias, None if remove else canonical)
+            click.echo(f"{changed} item(s) re-normalized.")
+        elif alias:
+            raise click.UsageError("Give CANONICAL, or --remove.")
+        for row in get_item_aliases():
+            click.echo(f"{row['alias']} -> {row['canonical']}")
+
+    @app.cli.command("purge-lookup-cache")
+    def purge_lookup_cache_cmd():
+        """Delete expired image/price lookups (job workers also do this hourly while idle)."""
+        click.echo(f"{lookup_cache.purge_expired()} expired row(s) deleted.")
+
+    @app.cli.command("rebuild-box-stats")
+    @click.option("--check", is_flag=True, help="Only report boxes whose totals drifted; exit 1 if any.")
+    def rebuild_box_stats_cmd(check):
+        """Verify box_stats against the items table, then rebuild it from scratch."""
+        con = get_db()
+        drifted = check_box_stats(con)
+        for box_id in drifted:
+            click.echo(f"box {box_id}: box_stats out of date")
+        if check:
+            con.close()
+            if drifted:
+                raise SystemExit(1)
+            click.echo("box_stats is consistent.")
+            return
+        con.execute("BEGIN IMMEDIATE")
+        rebuild_box_stats(con)
+        con.commit()
+        con.close()
+        click.echo(f"box_stats rebuilt ({len(drifted)} box(es) were out of date).")
+
+    @app.cli.command("export")
+    @click.option("--format", "fmt", type=click.Choice(sorted(EXPORT_FORMATS)), default="csv", show_default=True)
+    @click.option("--after", "after_id", default=0, help="Resume after this item_id (the last row already written).")
+    @click.option("--gzip", "gz", is_flag=True, help="Gzip the output (implied by a .gz OUTPUT).")
+    @click.argument("output", required=False, type=click.Path(dir_okay=False, path_type=Path))
+    def export_cmd(fmt, after_id, gz, output):
+        """Stream the whole inventory to OUTPUT (default: stdout)."""
+        body = export_inventory(fmt, after_id=after_id)
+        if gz or (output and output.suffix == ".gz"):
+            body = gzip_chunks(body)  # a resumed run appends a second gzip member, which gunzip accepts
+        out = open(output, "ab" if after_id else "wb") if output else click.get_binary_stream("stdout")
+        try:
+            for chunk in body:
+                out.write(chunk)
+        finally:
+            if output:
+                out.close()
+
+    # background analysis/enrichment workers (JOB_WORKERS=0 to disable), only
+    # in processes that serve requests: a one-off `flask <command>` would claim
+    # jobs (import-photos queues them) and exit mid-run, leaving them stuck
+    # as running until JOB_STALE_S
+    if _serves_requests():
+        start_workers()
     return app
 
+def _serves_requests() -> bool:
+    """True under gunicorn/wsgi.py, `python app.py` and `flask run`; False for other CLI commands."""
+    ctx = click.get_current_context(silent=True)
+    return ctx is None or ctx.info_name == "run"
+
 if __name__ == "__main__":
     app = create_app()
     port = int(os.getenv("PORT", "8081"))
@@ -0,0 +1,97 @@
+"""
+Run the offline benchmark suite and print (or save) one JSON document that
+can be diffed across commits.
+
+    python -m benchmarks                       # every scenario, default sizes
+    python -m benchmarks --scenarios search --search-sizes 10000,100000,1000000
+    python -m benchmarks --out bench-$(git rev-parse --short HEAD).json
+"""
+import argparse, json, os, platform, sqlite3, sys, tempfile, time
+
+ORDER = ["new_box", "search", "index", "mixed", "enrich", "startup"]
+
+
+def _latency(values):
+    out = {}
+    for v in values or []:
+        provider, _, ms = v.partition("=")
+        out[provider] = float(ms) / 1000
+    return out
+
+
+def main(argv=None) -> dict:
+    parser = argparse.ArgumentParser(description="Offline benchmarks with stub providers.")
+    parser.add_argument("--scenarios", default=",".join(ORDER), help=f"comma list from {ORDER}")
+    parser.add_argument("--search-sizes", default="10000,100000,1000000")
+    parser.add_argument("--render-items", type=int, default=20_000, help="dataset size for index/mixed")
+    parser.add_argument("--photos", type=int, default=20, help="uploads in the new_box scenario")
+    parser.add_argument("--clients", type=int, default=4, help="concurrent uploaders in new_box")
+    parser.add_argument("--readers", type=int, default=6)
+    parser.add_argument("--writers", type=int, default=1)
+    parser.add_argument("--enrich-names", default="10,30,100", help="batch sizes (distinct names) for enrich")
+    parser.add_argument("--duration", type=float, default=10.0, help="seconds of mixed load")
+    parser.add_argument("--repeat", type=int, default=100, help="samples per timed call")
+    parser.add_argument("--latency", action="append", metavar="PROVIDER=MS",
+                        help="stub latency override, e.g. openai=1500 (repeatable)")
+    parser.add_argument("--s3-latency-ms", type=float, default=20)
+    parser.add_argument("--timeout", type=float, default=300, help="new_box completion timeout (s)")
+    parser.add_argument("--data-dir", help="reuse generated datasets from here (default: temp dir)")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--out", help="also write the JSON here")
+    args = parser.parse_args(argv)
+
+    wanted = [s for s in ORDER if s in args.scenarios.split(",")]
+    data_dir = args.data_dir or tempfile.mkdtemp(prefix="inventoryiq-bench-")
+    os.makedirs(data_dir, exist_ok=True)
+
+    # Must be in place before the app modules read their config at import.
+    from benchmarks.stubs import ProviderServer, install_fake_aws, route_outbound_to
+
+    server = ProviderServer(latency_s=_latency(args.latency)).start()
+    os.environ.update({
+        "OPENAI_API_KEY": "bench", "OPENAI_BASE_URL": f"{server.base_url}/v1",
+        "SERPAPI_KEY": "bench", "KROGER_CLIENT_ID": "bench", "KROGER_CLIENT_SECRET": "bench",
+        "SQLITE_PATH": os.path.join(data_dir, "app.sqlite3"),
+        # every provider is the same stub host, so don't cap per host below the overall limit
+        "HTTP_ASYNC_PER_HOST": os.getenv("HTTP_ASYNC_MAX_CONNECTIONS", "100"),
+    })
+    route_outbound_to(server)
+    s3 = install_fake_aws(args.s3_latency_ms / 1000)
+
+    from benchmarks.common import git_revision
+    from benchmarks.scenarios import SCENARIOS
+
+    ctx = {
+        "server": server, "s3": s3, "data_dir": data_dir, "seed": args.seed,
+        "search_sizes": [int(s) for s in args.search_sizes.split(",") if s.strip()],
+        "render_items": args.render_items, "photos": args.photos, "clients": args.clients,
+        "readers": args.readers, "writers": args.writers, "duration_s": args.duration,
+        "enrich_names": [int(s) for s in args.enrich_names.split(",") if s.strip()],
+        "repeat": args.repeat, "timeout_s": args.timeout,
+        "log": lambda msg: print(msg, file=sys.stderr),
+    }
+    report = {
+        "revision": git_revision(),
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+        "python": platform.python_version(),
+        "sqlite": sqlite3.sqlite_version,
+        "stub_latency_s": server.latency_s,
+        "scenarios": {},
+    }
+    for name in wanted:
+        ctx["log"](f"running {name}...")
+        started = time.perf_counter()
+        report["scenarios"][name] = SCENARIOS[name](ctx)
+        report["scenarios"][name]["wall_s"] = round(time.perf_counter() - started, 2)
+    server.stop()
+
+    text = json.dumps(report, indent=2, sort_keys=True)
+    print(text)
+    if args.out:
+        with open(args.out, "w") as f:
+            f.write(text + "\n")
+    return report
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,57 @@
+import os, statistics, subprocess, time
+from pathlib import Path
+from typing import Callable, Dict, List
+
+ROOT = Path(__file__).resolve().parents[1]
+
+
+def use_db(path) -> None:
+    """Point db.connection at `path` (this thread starts fresh) and migrate it."""
+    import db.connection as connection
+    from db.schema import run_migrations
+
+    con = getattr(connection._local, "con", None)
+    if con is not None:
+        con.really_close()
+        connection._local.con = None
+    connection.DB_PATH = Path(path)
+    run_migrations()
+
+
+def summarize(samples_s: List[float]) -> Dict[str, float]:
+    """Latency summary in milliseconds."""
+    if not samples_s:
+        return {"n": 0}
+    ordered = sorted(samples_s)
+
+    def pct(p: float) -> float:
+        return round(ordered[min(len(ordered) - 1, int(p * len(ordered)))] * 1000, 3)
+
+    return {
+        "n": len(ordered),
+        "mean_ms": round(statistics.fmean(ordered) * 1000, 3),
+        "p50_ms": pct(0.50),
+        "p95_ms": pct(0.95),
+        "p99_ms": pct(0.99),
+        "max_ms": round(ordered[-1] * 1000, 3),
+    }
+
+
+def time_calls(fn: Callable[[], object], n: int) -> List[float]:
+    samples = []
+    for _ in range(n):
+        start = time.perf_counter()
+        fn()
+        samples.append(time.perf_counter() - start)
+    return samples
+
+
+def git_revision() -> str:
+    try:
+        rev = subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=ROOT,
+                             capture_output=True, text=True, check=True).stdout.strip()
+        dirty = subprocess.run(["git", "status", "--porcelain", "--untracked-files=no"], cwd=ROOT,
+                               capture_output=True, text=True).stdout.strip()
+        return rev + ("-dirty" if dirty else "")
+    except Exception:
+        return os.getenv("GIT_COMMIT", "unknown")
@@ -0,0 +1,99 @@
+"""
+Synthetic inventory: fill a SQLite file with N boxes and M items.
+
+    python -m benchmarks.datagen --boxes 5000 --items 100000 [--db path]
+
+Defaults to the app's database (db.sqlite3 or $SQLITE_PATH); point --db at a
+scratch file to keep real data out of it.
+"""
+import argparse, json, random, time
+from datetime import datetime, timedelta
+from pathlib import Path
+
+from benchmarks.stubs import VOCAB_ADJECTIVES, random_item_name
+
+BOX_THEMES = ["Garage", "Kitchen", "Holiday", "Camping", "Kids", "Office", "Garden", "Tools", "Craft", "Attic"]
+CHUNK = 50_000
+
+
+def generate(db_path: Path, boxes: int, items: int, seed: int = 42) -> dict:
+    """
+    Append `boxes` boxes and `items` items (spread randomly over them) in one
+    transaction. The FTS, box_stats and version insert triggers are paused
+    during the load and caught up once at the end, which is far faster than
+    row by row.
+    """
+    from benchmarks.common import use_db
+    from db.connection import get_db
+    from db.schema import (BOX_STATS_DDL, SEARCH_INDEX_DDL, VERSION_DDL, has_search_index, rebuild_box_stats,
+                           rebuild_search_index)
+    from services.normalize import NameMatcher, load_aliases
+
+    use_db(db_path)
+    rng = random.Random(seed)
+    started = time.perf_counter()
+    con = get_db()
+    matcher = NameMatcher(load_aliases(con))
+    con.execute("BEGIN IMMEDIATE")
+    fts = has_search_index(con)
+    if fts:
+        con.execute("DROP TRIGGER IF EXISTS items_fts_ai")
+    con.execute("DROP TRIGGER IF EXISTS box_stats_ai")
+    con.execute("DROP TRIGGER IF EXISTS items_version_ai")
+
+    now = datetime.utcnow()
+    rows = []
+    for i in range(boxes):
+        digest = "%064x" % rng.getrandbits(256)
+        rows.append((f"{rng.choice(BOX_THEMES)} {rng.choice(VOCAB_ADJECTIVES)} #{i}",
+                     f"uploads/{digest[:2]}/{digest}.jpg", "", "ready",
+                     (now - timedelta(minutes=boxes - i)).isoformat(timespec="seconds"),
+                     digest, "[320, 640, 1280]"))
+    con.executemany(
+        "INSERT INTO boxes (name, photo, notes, status, created_at, photo_sha256, photo_variants) "
+        "VALUES (?,?,?,?,?,?,?)",
+        rows,
+    )
+    box_ids = [r[0] for r in con.execute("SELECT id FROM boxes ORDER BY id DESC LIMIT ?", (boxes,))]
+    added = now.isoformat(timespec="seconds")
+    for start in range(0, items, CHUNK):
+        n = min(CHUNK, items - start)
+        names = [random_item_name(rng) for _ in range(n)]
+        con.executemany(
+            "INSERT INTO items (box_id, name, confidence, image_url, price_cents, added_at, canonical_name) "
+            "VALUES (?,?,?,?,?,?,?)",
+            [(rng.choice(box_ids), name, round(rng.random(), 2),
+              f"https://img.stub.local/{rng.randrange(10_000)}.jpg", rng.randrange(100, 6000), added,
+              matcher.canonical(name))
+             for name in names],
+        )
+    if fts:
+        rebuild_search_index(con)
+        con.execute(SEARCH_INDEX_DDL[1])  # items_fts_ai
+    rebuild_box_stats(con)
+    con.execute(BOX_STATS_DDL[1])  # box_stats_ai
+    con.execute("UPDATE inventory_version SET version = version + 1")
+    con.execute(VERSION_DDL[1])  # items_version_ai
+    con.commit()
+    con.execute("ANALYZE")
+    con.close()
+    return {"db": str(db_path), "boxes": boxes, "items": items,
+            "elapsed_s": round(time.perf_counter() - started, 2)}
+
+
+def main(argv=None) -> dict:
+    from db.connection import DB_PATH
+
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--boxes", type=int, default=1000)
+    parser.add_argument("--items", type=int, default=20_000)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--db", type=Path, default=DB_PATH)
+    args = parser.parse_args(argv)
+    result = generate(args.db, args.boxes, args.items, args.seed)
+    print(json.dumps(result, indent=2))
+    return result
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,244 @@
+"""
+Benchmark scenarios. Each takes a `ctx` dict (stub server, fake S3, data
+directory, options) and returns a JSON-serialisable result.
+"""
+import random, re, threading, time
+from concurrent.futures import ThreadPoolExecutor
+from io import BytesIO
+from pathlib import Path
+from typing import Dict, List
+
+from benchmarks.common import summarize, time_calls, use_db
+from benchmarks.datagen import generate
+
+SEARCH_QUERIES = ["hammer", "blue", "light bulbs", "extension cord", "dr", "garage", "zzzz-no-hit"]
+
+_app = None
+
+
+def get_app():
+    """One app per process; the job workers it starts stay bound to the first DB."""
+    global _app
+    if _app is None:
+        from app import create_app
+        _app = create_app()
+    return _app
+
+
+def synthetic_jpeg(seed: int, size=(1600, 1200)) -> bytes:
+    """A unique, photo-sized JPEG (gradient + random blocks) for upload tests."""
+    from PIL import Image, ImageDraw
+
+    rng = random.Random(seed)
+    im = Image.linear_gradient("L").resize(size).convert("RGB")
+    draw = ImageDraw.Draw(im)
+    for _ in range(40):
+        x, y = rng.randrange(size[0]), rng.randrange(size[1])
+        draw.rectangle([x, y, x + rng.randrange(40, 400), y + rng.randrange(40, 300)],
+                       fill=(rng.randrange(256), rng.randrange(256), rng.randrange(256)))
+    buf = BytesIO()
+    im.save(buf, "JPEG", quality=90)
+    return buf.getvalue()
+
+
+def dataset(ctx: dict, items: int) -> Path:
+    """Generated DB with `items` items (20 per box), reused from the data dir if present."""
+    path = Path(ctx["data_dir"]) / f"bench_{items}.sqlite3"
+    if not path.exists():
+        ctx["log"](f"generating {items:,} items -> {path}")
+        generate(path, boxes=max(1, items // 20), items=items)
+    use_db(path)
+    return path
+
+
+# ---------- scenarios ----------
+
+def new_box(ctx: dict) -> Dict:
+    """POST /new with fresh photos and wait until each box is analyzed and enriched."""
+    from db.queries import get_box
+
+    use_db(Path(ctx["data_dir"]) / f"new_box_{int(time.time())}.sqlite3")
+    app = get_app()
+    photos = [synthetic_jpeg(ctx["seed"] * 100_000 + i) for i in range(ctx["photos"])]
+    submitted: Dict[int, float] = {}
+    submit_s: List[float] = []
+    lock = threading.Lock()
+
+    def submit(data: bytes) -> None:
+        client = app.test_client()
+        start = time.perf_counter()
+        r = client.post("/new", data={"photo": (BytesIO(data), "photo.jpg")},
+                        content_type="multipart/form-data")
+        elapsed = time.perf_counter() - start
+        box_id = int(re.search(r"/box/(\d+)", r.headers["Location"]).group(1))
+        with lock:
+            submit_s.append(elapsed)
+            submitted[box_id] = start
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=ctx["clients"]) as pool:
+        list(pool.map(submit, photos))
+
+    done: Dict[int, float] = {}
+    deadline = time.perf_counter() + ctx["timeout_s"]
+    while len(done) < len(submitted) and time.perf_counter() < deadline:
+        for box_id in submitted.keys() - done.keys():
+            if (get_box(box_id)["status"] or "ready") in ("ready", "failed"):
+                done[box_id] = time.perf_counter()
+        time.sleep(0.02)
+    elapsed = time.perf_counter() - started
+    return {
+        "photos": len(photos),
+        "completed": len(done),
+        "submit": summarize(submit_s),
+        "end_to_end": summarize([done[b] - submitted[b] for b in done]),
+        "boxes_per_min": round(len(done) * 60 / elapsed, 1),
+        "provider_requests": dict(ctx["server"].requests),
+        "s3_calls": dict(ctx["s3"].calls),
+    }
+
+
+def search(ctx: dict) -> Dict:
+    """search_items (first page and second page) per query at each dataset size."""
+    from db.queries import search_items
+
+    out = {}
+    for size in ctx["search_sizes"]:
+        dataset(ctx, size)
+        per_query = {}
+        for q in SEARCH_QUERIES + [""]:
+            rows, cursor = search_items(q, limit=48)  # warm the page cache
+            result = {"hits_first_page": len(rows),
+                      "first_page": summarize(time_calls(lambda: search_items(q, limit=48), ctx["repeat"]))}
+            if cursor:
+                result["second_page"] = summarize(
+                    time_calls(lambda: search_items(q, limit=48, cursor=cursor), ctx["repeat"]))
+            per_query[q or "(recent)"] = result
+        out[str(size)] = per_query
+    return out
+
+
+def index(ctx: dict) -> Dict:
+    """Render the box list (first and a later page) and a box detail page."""
+    from db.queries import list_boxes
+
+    dataset(ctx, ctx["render_items"])
+    client = get_app().test_client()
+    rows, cursor = list_boxes(limit=48)
+    box_id = rows[0]["id"]
+    client.get("/")  # warm templates
+    return {
+        "items": ctx["render_items"],
+        "index": summarize(time_calls(lambda: client.get("/"), ctx["repeat"])),
+        "index_page_2": summarize(time_calls(lambda: client.get(f"/?cursor={cursor}"), ctx["repeat"])),
+        "box_detail": summarize(time_calls(lambda: client.get(f"/box/{box_id}"), ctx["repeat"])),
+        "search_page": summarize(time_calls(lambda: client.get("/search/?q=hammer"), ctx["repeat"])),
+    }
+
+
+def mixed(ctx: dict) -> Dict:
+    """Concurrent readers (list, detail, search API) plus writers (box edits) for a fixed time."""
+    from db.queries import get_items, list_boxes
+
+    dataset(ctx, ctx["render_items"])
+    app = get_app()
+    box_ids = [r["id"] for r in list_boxes(limit=200)[0]]
+    stop_at = time.perf_counter() + ctx["duration_s"]
+    samples: Dict[str, List[float]] = {}
+    errors: Dict[str, int] = {}
+    lock = threading.Lock()
+
+    def record(op: str, start: float, ok: bool) -> None:
+        with lock:
+            samples.setdefault(op, []).append(time.perf_counter() - start)
+            if not ok:
+                errors[op] = errors.get(op, 0) + 1
+
+    def reader(n: int) -> None:
+        client, rng = app.test_client(), random.Random(n)
+        while time.perf_counter() < stop_at:
+            op = rng.choice(["index", "detail", "search_api"])
+            start = time.perf_counter()
+            if op == "index":
+                r = client.get("/")
+            elif op == "detail":
+                r = client.get(f"/box/{rng.choice(box_ids)}")
+            else:
+                r = client.get(f"/search/api?q={rng.choice(SEARCH_QUERIES)}")
+            record(op, start, r.status_code == 200)
+
+    def writer(n: int) -> None:
+        client, rng = app.test_client(), random.Random(1000 + n)
+        while time.perf_counter() < stop_at:
+            box_id = rng.choice(box_ids)
+            form = {"name": f"Edited box {rng.randrange(10_000)}"}
+            for i, it in enumerate(get_items(box_id)):
+                form[f"items[{i}].name"] = it["name"]
+                form[f"items[{i}].confidence"] = str(it["confidence"])
+            start = time.perf_counter()
+            r = client.post(f"/box/{box_id}", data=form)
+            record("edit", start, r.status_code in (200, 302))
+
+    threads = [threading.Thread(target=reader, args=(i,)) for i in range(ctx["readers"])]
+    threads += [threading.Thread(target=writer, args=(i,)) for i in range(ctx["writers"])]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    return {
+        "readers": ctx["readers"],
+        "writers": ctx["writers"],
+        "duration_s": ctx["duration_s"],
+        "throughput_per_s": {op: round(len(s) / ctx["duration_s"], 1) for op, s in samples.items()},
+        "latency": {op: summarize(s) for op, s in samples.items()},
+        "errors": errors,
+    }
+
+
+def enrich(ctx: dict) -> Dict:
+    """
+    enrich_items over batches of distinct, uncached names, on the async
+    provider loop and on the thread-pool fallback. round_trips = wall time /
+    the slowest single provider call an item needs.
+    """
+    import services.outbound as outbound
+    from benchmarks.stubs import random_item_name
+    from services.enrich import enrich_items
+
+    use_db(Path(ctx["data_dir"]) / f"enrich_{int(time.time())}.sqlite3")
+    latency = ctx["server"].latency_s
+    round_trip = max(latency["serpapi"], latency["kroger"])
+    rng = random.Random(ctx["seed"])
+    enrich_items([{"name": "warm up token and store"}])  # Kroger token + location, once
+    out: Dict = {"provider_round_trip_s": round_trip}
+    modes = [("async", True), ("threads", False)] if outbound.async_enabled() else [("threads", False)]
+    saved = outbound.HTTP_ASYNC
+    try:
+        for mode, flag in modes:
+            outbound.HTTP_ASYNC = flag
+            out[mode] = {}
+            for n in ctx["enrich_names"]:
+                items = [{"name": f"{random_item_name(rng)} {mode} {n} {i}", "confidence": 0.5} for i in range(n)]
+                start = time.perf_counter()
+                rows = enrich_items(items)
+                elapsed = time.perf_counter() - start
+                out[mode][str(n)] = {
+                    "wall_s": round(elapsed, 3),
+                    "round_trips": round(elapsed / round_trip, 2),
+                    "items_per_s": round(n / elapsed, 1),
+                    "with_image": sum(1 for r in rows if r[2]),
+                    "with_price": sum(1 for r in rows if r[3] is not None),
+                }
+    finally:
+        outbound.HTTP_ASYNC = saved
+    return out
+
+
+def startup(ctx: dict) -> Dict:
+    from benchmarks import startup as startup_bench
+
+    return startup_bench.measure(runs=max(3, ctx["repeat"] // 20))
+
+
+SCENARIOS = {"new_box": new_box, "search": search, "index": index, "mixed": mixed, "enrich": enrich,
+             "startup": startup}
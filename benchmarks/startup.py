@@ -0,0 +1,53 @@
+"""
+Cold-start benchmark: time `import app` and `create_app()` in fresh
+interpreters (no job workers, throwaway SQLite file).
+
+    python -m benchmarks.startup --runs 5
+"""
+import argparse, json, os, statistics, subprocess, sys, tempfile
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parents[1]
+
+_PROBE = """
+import json, time
+t0 = time.perf_counter()
+import app
+t1 = time.perf_counter()
+app.create_app()
+t2 = time.perf_counter()
+print(json.dumps({"import_s": t1 - t0, "create_app_s": t2 - t1}))
+"""
+
+
+def run_once(db_path: str) -> dict:
+    env = dict(os.environ, JOB_WORKERS="0", SQLITE_PATH=db_path)
+    out = subprocess.run([sys.executable, "-c", _PROBE], cwd=ROOT, env=env,
+                         capture_output=True, text=True, check=True).stdout
+    return json.loads(out.strip().splitlines()[-1])
+
+
+def measure(runs: int = 5) -> dict:
+    with tempfile.TemporaryDirectory() as tmp:
+        db_path = os.path.join(tmp, "startup.sqlite3")
+        run_once(db_path)  # first run creates the schema; not a cold *boot*
+        samples = [run_once(db_path) for _ in range(runs)]
+    result = {"runs": runs}
+    for key in ("import_s", "create_app_s"):
+        values = [r[key] for r in samples]
+        result[key] = {"median": round(statistics.median(values), 4), "max": round(max(values), 4)}
+    result["total_s"] = round(result["import_s"]["median"] + result["create_app_s"]["median"], 4)
+    return result
+
+
+def main(argv=None) -> dict:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--runs", type=int, default=5)
+    args = parser.parse_args(argv)
+    result = dict(scenario="startup", **measure(args.runs))
+    print(json.dumps(result, indent=2))
+    return result
+
+
+if __name__ == "__main__":
+    main()
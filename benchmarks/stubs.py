@@ -0,0 +1,258 @@
+"""
+Local stand-ins for every external dependency, so benchmarks run offline:
+
+- ProviderServer: one threaded HTTP server answering as OpenAI (chat
+  completions), SerpAPI, Openverse, Wikipedia and Kroger, each with its own
+  configurable latency.
+- FakeS3 / FakeSTS: in-process replacements for the boto3 clients in
+  storage_s3 (uploads kept in memory, presigned URLs are deterministic).
+"""
+import hashlib, json, random, sys, threading, time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from io import BytesIO
+from typing import Dict, Optional
+from urllib.parse import parse_qs, urlsplit
+
+from requests.adapters import HTTPAdapter
+
+VOCAB_NOUNS = [
+    "hammer", "screwdriver", "wrench", "pliers", "tape measure", "drill", "extension cord", "flashlight",
+    "batteries", "light bulbs", "paint brush", "roller", "sandpaper", "glue", "zip ties", "duct tape",
+    "garden hose", "gloves", "rake", "shovel", "pruners", "sprinkler", "bird feeder", "planter",
+    "christmas lights", "ornaments", "wreath", "tablecloth", "candles", "napkins", "plates", "mugs",
+    "blanket", "pillow", "sleeping bag", "tent", "lantern", "cooler", "camp stove", "water bottle",
+    "books", "board game", "puzzle", "lego", "stuffed animal", "crayons", "markers", "notebook",
+    "cables", "charger", "router", "keyboard", "mouse", "speaker", "headphones", "hard drive",
+]
+VOCAB_ADJECTIVES = [
+    "red", "blue", "small", "large", "old", "new", "metal", "plastic", "wooden", "spare",
+    "cordless", "folding", "vintage", "kids", "outdoor", "holiday", "broken", "rechargeable",
+]
+
+# provider -> seconds added to every response
+DEFAULT_LATENCY_S = {"openai": 0.8, "serpapi": 0.25, "openverse": 0.15, "wikipedia": 0.1, "kroger": 0.12}
+
+
+def random_item_name(rng: random.Random) -> str:
+    noun = rng.choice(VOCAB_NOUNS)
+    return f"{rng.choice(VOCAB_ADJECTIVES)} {noun}" if rng.random() < 0.6 else noun
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    server: "ProviderServer"
+
+    def log_message(self, *args):  # keep benchmark output clean
+        pass
+
+    def _send(self, body: dict, status: int = 200) -> None:
+        raw = json.dumps(body).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(raw)))
+        self.end_headers()
+        self.wfile.write(raw)
+
+    def _provider(self, host: str, path: str) -> str:
+        if path.startswith("/v1/chat/completions") or path.startswith("/chat/completions"):
+            return "openai"
+        for name in ("serpapi", "openverse", "wikipedia", "kroger"):
+            if name in host:
+                return name
+        return "unknown"
+
+    def _handle(self) -> None:
+        host = self.headers.get("X-Stub-Host", "")
+        parts = urlsplit(self.path)
+        query = {k: v[0] for k, v in parse_qs(parts.query).items()}
+        length = int(self.headers.get("Content-Length") or 0)
+        body = self.rfile.read(length) if length else b""
+        provider = self._provider(host, parts.path)
+        self.server.count(provider)
+        time.sleep(self.server.latency_s.get(provider, 0.0))
+        seed = hashlib.sha256(body + parts.query.encode()).digest()
+        rng = random.Random(seed)
+
+        if provider == "openai":
+            items = [{"name": random_item_name(rng), "confidence": round(rng.uniform(0.3, 0.99), 2)}
+                     for _ in range(self.server.items_per_photo)]
+            content = json.dumps({"box_name": f"{rng.choice(VOCAB_ADJECTIVES).title()} Box",
+                                  "items": items, "notes": "stub"})
+            return self._send({
+                "id": "chatcmpl-stub", "object": "chat.completion", "created": int(time.time()),
+                "model": "stub", "usage": {"prompt_tokens": 1, "completion_tokens": 1, "total_tokens": 2},
+                "choices": [{"index": 0, "finish_reason": "stop",
+                             "message": {"role": "assistant", "content": content}}],
+            })
+        q = query.get("q") or query.get("titles") or query.get("filter.term") or ""
+        img = f"https://img.stub.local/{hashlib.md5(q.encode()).hexdigest()}.jpg"
+        if provider == "serpapi":
+            if query.get("engine") == "google_shopping":
+                return self._send({"shopping_results": [{"price": f"${rng.uniform(2, 60):.2f}"}]})
+            return self._send({"images_results": [{"original": img}]})
+        if provider == "openverse":
+            return self._send({"results": [{"url": img, "thumbnail": img}]})
+        if provider == "wikipedia":
+            return self._send({"query": {"pages": {"1": {"original": {"source": img}}}}})
+        if provider == "kroger":
+            if parts.path.endswith("/token"):
+                return self._send({"access_token": "stub-token", "expires_in": 1800})
+            if parts.path.endswith("/locations"):
+                return self._send({"data": [{"locationId": "01400943"}]})
+            price = round(rng.uniform(1, 40), 2)
+            return self._send({"data": [{"items": [{"price": {"regular": price}}]}]})
+        self._send({"error": "unknown stub route"}, status=404)
+
+    do_GET = _handle
+    do_POST = _handle
+
+
+class ProviderServer(ThreadingHTTPServer):
+    daemon_threads = True
+    request_queue_size = 256  # the async client opens many connections at once
+
+    def __init__(self, latency_s: Optional[Dict[str, float]] = None, items_per_photo: int = 8):
+        super().__init__(("127.0.0.1", 0), _Handler)
+        self.latency_s = dict(DEFAULT_LATENCY_S, **(latency_s or {}))
+        self.items_per_photo = items_per_photo
+        self.requests: Dict[str, int] = {}
+        self._lock = threading.Lock()
+        self._thread = threading.Thread(target=self.serve_forever, name="provider-stub", daemon=True)
+
+    @property
+    def base_url(self) -> str:
+        host, port = self.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def handle_error(self, request, client_address):
+        # clients cancel lookups they no longer need (first hit wins); not an error
+        if not isinstance(sys.exc_info()[1], ConnectionError):
+            super().handle_error(request, client_address)
+
+    def count(self, provider: str) -> None:
+        with self._lock:
+            self.requests[provider] = self.requests.get(provider, 0) + 1
+
+    def start(self) -> "ProviderServer":
+        self._thread.start()
+        return self
+
+    def stop(self) -> None:
+        self.shutdown()
+        self.server_close()
+
+
+class _RedirectAdapter(HTTPAdapter):
+    """Sends every request to the stub server, remembering the real host in X-Stub-Host."""
+
+    def __init__(self, base_url: str, **kwargs):
+        super().__init__(**kwargs)
+        self.base_url = base_url
+
+    def send(self, request, **kwargs):
+        parts = urlsplit(request.url)
+        request.headers["X-Stub-Host"] = parts.netloc
+        request.url = f"{self.base_url}{parts.path}" + (f"?{parts.query}" if parts.query else "")
+        return super().send(request, **kwargs)
+
+
+def _redirect_request_class(base_url: str):
+    """aiohttp counterpart of _RedirectAdapter for the async provider client (None without aiohttp)."""
+    try:
+        import aiohttp
+        from yarl import URL
+    except ImportError:
+        return None
+
+    target = URL(base_url)
+
+    class _RedirectRequest(aiohttp.ClientRequest):
+        def __init__(self, method, url, *args, headers=None, **kwargs):
+            headers = dict(headers or {})
+            headers["X-Stub-Host"] = url.host
+            url = url.with_scheme(target.scheme).with_host(target.host).with_port(target.port)
+            super().__init__(method, url, *args, headers=headers, **kwargs)
+
+    return _RedirectRequest
+
+
+def route_outbound_to(server: ProviderServer) -> None:
+    """Point services.outbound (every sync and async provider call) at the stub server."""
+    from services.outbound import HTTP_POOL_MAXSIZE, client, configure_async_session
+
+    adapter = _RedirectAdapter(server.base_url, pool_connections=4, pool_maxsize=HTTP_POOL_MAXSIZE)
+    client.session.mount("https://", adapter)
+    client.session.mount("http://", adapter)
+    request_class = _redirect_request_class(server.base_url)
+    if request_class:
+        configure_async_session(request_class=request_class)
+
+
+class FakeS3:
+    """The subset of the boto3 S3 client storage_s3 uses, backed by a dict."""
+
+    def __init__(self, latency_s: float = 0.02):
+        from botocore.exceptions import ClientError
+
+        self.latency_s = latency_s
+        self.objects: Dict[str, bytes] = {}
+        self.calls: Dict[str, int] = {}
+        self._lock = threading.Lock()
+        self.exceptions = type("exceptions", (), {"ClientError": ClientError})
+
+    def _count(self, op: str) -> None:
+        with self._lock:
+            self.calls[op] = self.calls.get(op, 0) + 1
+
+    def upload_fileobj(self, fileobj, bucket, key, ExtraArgs=None, Config=None):
+        self._count("put")
+        data = fileobj.read()
+        time.sleep(self.latency_s)
+        with self._lock:
+            self.objects[key] = data
+
+    def head_object(self, Bucket, Key):
+        self._count("head")
+        with self._lock:
+            if Key in self.objects:
+                return {"ContentLength": len(self.objects[Key])}
+        raise self.exceptions.ClientError({"Error": {"Code": "404"}}, "HeadObject")
+
+    def get_object(self, Bucket, Key):
+        self._count("get")
+        time.sleep(self.latency_s)
+        with self._lock:
+            return {"Body": BytesIO(self.objects[Key])}
+
+    def generate_presigned_url(self, op, Params=None, ExpiresIn=3600):
+        self._count("presign")
+        key = (Params or {}).get("Key", "")
+        sig = hashlib.sha256(f"{key}{time.time()}".encode()).hexdigest()[:32]
+        return f"https://s3.stub.local/{key}?X-Amz-Expires={ExpiresIn}&X-Amz-Signature={sig}"
+
+
+class _FakeCredentials:
+    access_key, token = "AKIASTUBSTUBSTUB", None
+
+    def get_frozen_credentials(self):
+        return self
+
+
+class FakeSTS:
+    def get_caller_identity(self):
+        return {"Account": "000000000000", "Arn": "arn:aws:iam::000000000000:user/bench"}
+
+
+class _FakeSession:
+    def get_credentials(self):
+        return _FakeCredentials()
+
+
+def install_fake_aws(s3_latency_s: float = 0.02) -> FakeS3:
+    """Pre-fill storage_s3's lazy client cache so boto3 is never touched."""
+    import storage_s3
+
+    s3 = FakeS3(latency_s=s3_latency_s)
+    storage_s3._clients.clear()
+    storage_s3._clients.update(session=_FakeSession(), source="stub", s3=s3, sts=FakeSTS(), transfer=None)
+    return s3
@@ -1,10 +1,77 @@
+import os
 import sqlite3
+import threading
 from pathlib import Path
 
-DB_PATH = Path(__file__).resolve().parents[1] / "db.sqlite3"
+from flask import g, has_app_context
 
-def get_db():
-    con = sqlite3.connect(DB_PATH)
+DB_PATH = Path(os.getenv("SQLITE_PATH") or Path(__file__).resolve().parents[1] / "db.sqlite3")
+
+# Per-connection tuning, all overridable from the environment.
+SQLITE_JOURNAL_MODE = os.getenv("SQLITE_JOURNAL_MODE", "WAL")
+SQLITE_SYNCHRONOUS = os.getenv("SQLITE_SYNCHRONOUS", "NORMAL")
+SQLITE_BUSY_TIMEOUT_MS = int(os.getenv("SQLITE_BUSY_TIMEOUT_MS", "5000"))
+SQLITE_MMAP_SIZE = int(os.getenv("SQLITE_MMAP_SIZE", str(256 * 1024 * 1024)))
+SQLITE_CACHE_SIZE_KB = int(os.getenv("SQLITE_CACHE_SIZE_KB", "20000"))
+SQLITE_STATEMENT_CACHE = int(os.getenv("SQLITE_STATEMENT_CACHE", "256"))
+
+_local = threading.local()
+
+
+class ManagedConnection(sqlite3.Connection):
+    """
+    A connection owned by the current request (Flask app context) or thread.
+    Callers keep the usual `con = get_db() ... con.close()` shape; close()
+    only discards an unfinished transaction and hands the connection back.
+    """
+
+    def close(self):
+        if self.in_transaction:
+            self.rollback()
+
+    def really_close(self):
+        super().close()
+
+
+def _connect() -> ManagedConnection:
+    con = sqlite3.connect(
+        DB_PATH,
+        factory=ManagedConnection,
+        timeout=SQLITE_BUSY_TIMEOUT_MS / 1000,
+        cached_statements=SQLITE_STATEMENT_CACHE,
+    )
     con.row_factory = sqlite3.Row
+    con.execute(f"PRAGMA journal_mode = {SQLITE_JOURNAL_MODE}")
+    con.execute(f"PRAGMA synchronous = {SQLITE_SYNCHRONOUS}")
+    con.execute(f"PRAGMA busy_timeout = {SQLITE_BUSY_TIMEOUT_MS}")
+    con.execute(f"PRAGMA mmap_size = {SQLITE_MMAP_SIZE}")
+    con.execute(f"PRAGMA cache_size = -{SQLITE_CACHE_SIZE_KB}")
+    con.execute("PRAGMA temp_store = MEMORY")
     con.execute("PRAGMA foreign_keys = ON")
     return con
+
+
+def get_db() -> ManagedConnection:
+    """
+    Inside a request: one connection per app context, closed on teardown.
+    Elsewhere (job workers, thread pools, CLI): one connection per thread.
+    """
+    if has_app_context():
+        con = g.get("_db")
+        if con is None:
+            con = g._db = _connect()
+        return con
+    con = getattr(_local, "con", None)
+    if con is None:
+        con = _local.con = _connect()
+    return con
+
+
+def close_db(exc=None):
+    con = g.pop("_db", None)
+    if con is not None:
+        con.really_close()
+
+
+def init_app(app):
+    app.teardown_appcontext(close_db)
@@ -1,80 +1,387 @@
+import base64, json, re, sqlite3, time
 from datetime import datetime
-from typing import List, Tuple, Optional
+from typing import Any, Iterator, List, Tuple, Optional
 from .connection import get_db
+from services.metrics import timed
+from services.normalize import basic_form, canonical_name, get_matcher, invalidate as invalidate_matcher
 
-def list_boxes():
+def encode_cursor(*values: Any) -> str:
+    """Opaque keyset cursor: the sort key of the last row on a page."""
+    return base64.urlsafe_b64encode(json.dumps(values).encode()).decode().rstrip("=")
+
+def decode_cursor(cursor: str, *types) -> list:
+    """
+    Values of a cursor holding one value per entry in `types` (a type or a
+    tuple of types, as for isinstance). Raises ValueError for anything else,
+    which the routes turn into a 400.
+    """
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        values = json.loads(raw)
+    except Exception:
+        raise ValueError("invalid cursor")
+    if not isinstance(values, list) or len(values) != len(types):
+        raise ValueError("invalid cursor")
+    for value, expected in zip(values, types):
+        # bool is an int subclass, but never part of a sort key
+        if isinstance(value, bool) or not isinstance(value, expected):
+            raise ValueError("invalid cursor")
+    return values
+
+@timed("db.list_boxes")
+def list_boxes(limit: int = 48, cursor: Optional[str] = None):
+    """
+    Newest-first page of boxes with just the columns the index needs, plus
+    their box_stats totals (item_count, total_price_cents, max_confidence,
+    last_added_at). Returns (rows, next_cursor); next_cursor is None on the
+    last page.
+    """
+    con = get_db()
+    sql = (
+        "SELECT b.id, b.name, b.photo, b.photo_variants, b.status, b.created_at, b.version, "
+        "COALESCE(s.item_count, 0) AS item_count, COALESCE(s.total_price_cents, 0) AS total_price_cents, "
+        "s.max_confidence, s.last_added_at "
+        "FROM boxes b LEFT JOIN box_stats s ON s.box_id = b.id"
+    )
+    params: list = []
+    if cursor:
+        (before_id,) = decode_cursor(cursor, int)
+        sql += " WHERE b.id < ?"
+        params.append(before_id)
+    sql += " ORDER BY b.id DESC LIMIT ?"
+    params.append(limit + 1)
+    rows = con.execute(sql, params).fetchall()
+    con.close()
+    next_cursor = encode_cursor(rows[limit - 1]["id"]) if len(rows) > limit else None
+    return rows[:limit], next_cursor
+
+@timed("db.inventory_summary")
+def inventory_summary() -> dict:
+    """Totals across every box, read from box_stats: boxes, items, value_cents."""
     con = get_db()
-    rows = con.execute("SELECT * FROM boxes ORDER BY id DESC").fetchall()
+    row = con.execute(
+        "SELECT (SELECT COUNT(*) FROM boxes) AS boxes, "
+        "COALESCE(SUM(item_count), 0) AS items, COALESCE(SUM(total_price_cents), 0) AS value_cents "
+        "FROM box_stats"
+    ).fetchone()
     con.close()
-    return rows
+    return dict(row)
 
+@timed("db.get_inventory_version")
+def get_inventory_version() -> int:
+    """Bumped by triggers on every box/item change (see db.schema.VERSION_DDL)."""
+    con = get_db()
+    row = con.execute("SELECT version FROM inventory_version WHERE id = 1").fetchone()
+    con.close()
+    return row["version"] if row else 0
+
+@timed("db.get_box_version")
+def get_box_version(box_id: int) -> Optional[int]:
+    """The box's change counter, or None if it doesn't exist."""
+    con = get_db()
+    row = con.execute("SELECT version FROM boxes WHERE id=?", (box_id,)).fetchone()
+    con.close()
+    return row["version"] if row else None
+
+@timed("db.get_box")
 def get_box(box_id: int):
     con = get_db()
     row = con.execute("SELECT * FROM boxes WHERE id=?", (box_id,)).fetchone()
     con.close()
     return row
 
-def insert_box(name: str, photo: Optional[str], notes: str = "") -> int:
+@timed("db.insert_box")
+def insert_box(name: str, photo: Optional[str], notes: str = "", status: str = "ready") -> int:
     con = get_db()
     cur = con.cursor()
     cur.execute(
-        "INSERT INTO boxes (name, photo, notes, created_at) VALUES (?,?,?,?)",
-        (name, photo, notes, datetime.utcnow().isoformat(timespec="seconds")),
+        "INSERT INTO boxes (name, photo, notes, status, created_at) VALUES (?,?,?,?,?)",
+        (name, photo, notes, status, datetime.utcnow().isoformat(timespec="seconds")),
     )
     con.commit()
     box_id = cur.lastrowid
     con.close()
     return box_id
 
+@timed("db.insert_boxes_batch")
+def insert_boxes_batch(boxes: List[dict]) -> List[int]:
+    """
+    Many boxes in one transaction (bulk import). Each dict has name, photo and
+    optionally notes, status, photo_sha256, photo_phash, photo_variants (list),
+    items [(name, confidence, image_url, price_cents)] and job
+    (kind, payload, max_attempts) to queue for the new box.
+    """
+    if not boxes:
+        return []
+    matcher = get_matcher()
+    con = get_db()
+    cur = con.cursor()
+    now = datetime.utcnow().isoformat(timespec="seconds")
+    ids = []
+    try:  # close() rolls back a half-written batch
+        for b in boxes:
+            variants = b.get("photo_variants")
+            cur.execute(
+                "INSERT INTO boxes (name, photo, notes, status, created_at, photo_sha256, photo_phash, photo_variants) "
+                "VALUES (?,?,?,?,?,?,?,?)",
+                (b["name"], b.get("photo"), b.get("notes", ""), b.get("status", "ready"), now,
+                 b.get("photo_sha256"), b.get("photo_phash"),
+                 json.dumps(sorted(variants)) if variants else None),
+            )
+            box_id = cur.lastrowid
+            cur.executemany(
+                "INSERT INTO items (box_id, name, confidence, image_url, price_cents, added_at, canonical_name) "
+                "VALUES (?,?,?,?,?,?,?)",
+                [(box_id, n, float(c or 0.0), img, price, now, matcher.canonical(n))
+                 for (n, c, img, price) in b.get("items") or []],
+            )
+            if b.get("job"):
+                kind, payload, max_attempts = b["job"]
+                _insert_job(cur, kind, box_id, payload, max_attempts)
+            ids.append(box_id)
+        con.commit()
+    finally:
+        con.close()
+    return ids
+
+@timed("db.update_box_name")
 def update_box_name(box_id: int, name: str):
     con = get_db()
     con.execute("UPDATE boxes SET name=? WHERE id=?", (name, box_id))
     con.commit()
     con.close()
 
+@timed("db.update_box_photo")
+def update_box_photo(box_id: int, photo: Optional[str], sha256: Optional[str] = None,
+                     phash: Optional[str] = None, variants: Optional[List[int]] = None):
+    """New photo => its thumbnails have to be generated again, unless `variants` are known."""
+    con = get_db()
+    con.execute(
+        "UPDATE boxes SET photo=?, photo_sha256=?, photo_phash=?, photo_variants=? WHERE id=?",
+        (photo, sha256, phash, json.dumps(sorted(variants)) if variants else None, box_id),
+    )
+    con.commit()
+    con.close()
+
+@timed("db.find_photo_by_sha256")
+def find_photo_by_sha256(sha256: str):
+    """Some box already holding these exact bytes (photo key + thumbnails), or None."""
+    con = get_db()
+    row = con.execute(
+        "SELECT photo, photo_variants FROM boxes WHERE photo_sha256=? AND photo IS NOT NULL "
+        "ORDER BY photo_variants IS NULL, id DESC LIMIT 1",
+        (sha256,),
+    ).fetchone()
+    con.close()
+    return row
+
+@timed("db.set_photo_variants")
+def set_photo_variants(box_id: int, photo: str, widths: List[int]):
+    """Record thumbnail widths, unless the photo was replaced meanwhile."""
+    con = get_db()
+    con.execute(
+        "UPDATE boxes SET photo_variants=? WHERE id=? AND photo=?",
+        (json.dumps(sorted(widths)), box_id, photo),
+    )
+    con.commit()
+    con.close()
+
+@timed("db.claim_photo_variants")
+def claim_photo_variants(box_id: int) -> bool:
+    """
+    Mark a box's thumbnails as in progress ('[]') if nobody has yet.
+    True means the caller should generate them.
+    """
+    con = get_db()
+    cur = con.execute(
+        "UPDATE boxes SET photo_variants='[]' WHERE id=? AND photo_variants IS NULL", (box_id,)
+    )
+    con.commit()
+    con.close()
+    return cur.rowcount == 1
+
+@timed("db.update_box_analysis")
+def update_box_analysis(box_id: int, name: str, notes: str, status: str):
+    con = get_db()
+    con.execute("UPDATE boxes SET name=?, notes=?, status=? WHERE id=?", (name, notes, status, box_id))
+    con.commit()
+    con.close()
+
+@timed("db.set_box_status")
+def set_box_status(box_id: int, status: str):
+    con = get_db()
+    con.execute("UPDATE boxes SET status=? WHERE id=?", (status, box_id))
+    con.commit()
+    con.close()
+
+@timed("db.get_items")
 def get_items(box_id: int):
     con = get_db()
     rows = con.execute("SELECT * FROM items WHERE box_id=? ORDER BY id ASC", (box_id,)).fetchall()
     con.close()
     return rows
 
+@timed("db.insert_item")
 def insert_item(box_id: int, name: str, confidence: float,
                 image_url: Optional[str], price_cents: Optional[int]):
+    canonical = canonical_name(name)
     con = get_db()
     con.execute(
-        "INSERT INTO items (box_id, name, confidence, image_url, price_cents, added_at) "
-        "VALUES (?,?,?,?,?,?)",
+        "INSERT INTO items (box_id, name, confidence, image_url, price_cents, added_at, canonical_name) "
+        "VALUES (?,?,?,?,?,?,?)",
         (box_id, name, float(confidence or 0.0), image_url, price_cents,
-         datetime.utcnow().isoformat(timespec="seconds")),
+         datetime.utcnow().isoformat(timespec="seconds"), canonical),
     )
     con.commit()
     con.close()
 
-def replace_items(box_id: int, pairs: List[Tuple[str, float, str, Optional[int]]]):
-    """pairs = [(name, confidence, image_url, price_cents), ...]"""
+@timed("db.insert_items")
+def insert_items(box_id: int, pairs: List[Tuple[str, float, Optional[str], Optional[int]]]):
+    """Bulk insert in one transaction. pairs = [(name, confidence, image_url, price_cents), ...]"""
+    if not pairs:
+        return
+    matcher = get_matcher()
     con = get_db()
-    cur = con.cursor()
-    cur.execute("DELETE FROM items WHERE box_id=?", (box_id,))
     now = datetime.utcnow().isoformat(timespec="seconds")
-    cur.executemany(
-        "INSERT INTO items (box_id, name, confidence, image_url, price_cents, added_at) "
-        "VALUES (?,?,?,?,?,?)",
-        [(box_id, n, float(c or 0.0), img, price, now) for (n, c, img, price) in pairs]
+    con.executemany(
+        "INSERT INTO items (box_id, name, confidence, image_url, price_cents, added_at, canonical_name) "
+        "VALUES (?,?,?,?,?,?,?)",
+        [(box_id, n, float(c or 0.0), img, price, now, matcher.canonical(n)) for (n, c, img, price) in pairs]
+    )
+    con.commit()
+    con.close()
+
+@timed("db.get_unenriched_items")
+def get_unenriched_items(box_id: int):
+    """Items whose image lookup never completed (deadline hit or provider error)."""
+    con = get_db()
+    rows = con.execute(
+        "SELECT * FROM items WHERE box_id=? AND image_url IS NULL ORDER BY id ASC", (box_id,)
+    ).fetchall()
+    con.close()
+    return rows
+
+@timed("db.update_items_enrichment")
+def update_items_enrichment(rows: List[Tuple[int, Optional[str], Optional[int]]]):
+    """rows = [(item_id, image_url, price_cents), ...]; only fills what is still empty."""
+    if not rows:
+        return
+    con = get_db()
+    con.executemany(
+        "UPDATE items SET image_url=COALESCE(image_url, ?), price_cents=COALESCE(price_cents, ?) WHERE id=?",
+        [(img, price, item_id) for (item_id, img, price) in rows]
     )
     con.commit()
     con.close()
 
-def search_items(q: str):
+@timed("db.replace_items")
+def replace_items(box_id: int, pairs: List[Tuple[str, float, Optional[str], Optional[int]]],
+                  ids: Optional[List[Optional[int]]] = None) -> dict:
     """
-    Tokenized, case-insensitive search across item AND box names.
-    'steel pot' => AND across tokens; each token may match item or box.
+    Make the box's items match pairs = [(name, confidence, image_url, price_cents), ...]
+    by diffing against the current rows, in one transaction. ids[i] (optional)
+    is the row pairs[i] edits; pairs without one are matched to a row by
+    canonical name. Matched rows keep their id and added_at, and an
+    image_url/price_cents of None keeps what the row has unless the canonical
+    name changed. Leftover rows are deleted. Returns counts of
+    inserted/updated/deleted/unchanged rows.
+    """
+    ids = list(ids or [])
+    ids += [None] * (len(pairs) - len(ids))
+    matcher = get_matcher()
+    canonical = [matcher.canonical(name) for name, *_rest in pairs]
+    con = get_db()
+    cur = con.cursor()
+    stats = {"inserted": 0, "updated": 0, "deleted": 0, "unchanged": 0}
+    try:  # close() rolls back a half-applied diff
+        cur.execute("BEGIN IMMEDIATE")
+        current = {r["id"]: r for r in cur.execute(
+            "SELECT id, name, canonical_name, confidence, image_url, price_cents FROM items "
+            "WHERE box_id=? ORDER BY id ASC",
+            (box_id,))}
+        # claim rows by id first, then hand out what's left by canonical name (in id order)
+        matched: List[Optional[sqlite3.Row]] = [current.pop(i, None) if i is not None else None for i in ids]
+        by_name: dict = {}
+        for row in current.values():
+            by_name.setdefault(row["canonical_name"], []).append(row)
+        for i, key in enumerate(canonical):
+            if matched[i] is None and by_name.get(key):
+                matched[i] = by_name[key].pop(0)
+                del current[matched[i]["id"]]
+
+        now = datetime.utcnow().isoformat(timespec="seconds")
+        inserts, renames, updates = [], [], []
+        for row, key, (name, conf, img, price) in zip(matched, canonical, pairs):
+            conf = float(conf or 0.0)
+            if row is None:
+                inserts.append((box_id, name, conf, img, price, now, key))
+                continue
+            if key == row["canonical_name"]:
+                img = row["image_url"] if img is None else img
+                price = row["price_cents"] if price is None else price
+            if name != row["name"]:
+                renames.append((name, conf, img, price, key, row["id"]))
+            elif (conf, img, price) == (row["confidence"], row["image_url"], row["price_cents"]):
+                stats["unchanged"] += 1
+            else:
+                updates.append((conf, img, price, row["id"]))
+        if current:
+            cur.executemany("DELETE FROM items WHERE id=?", [(i,) for i in current])
+        # name is only SET on renames, so the FTS update trigger skips the rest
+        cur.executemany(
+            "UPDATE items SET name=?, confidence=?, image_url=?, price_cents=?, canonical_name=? WHERE id=?",
+            renames,
+        )
+        cur.executemany("UPDATE items SET confidence=?, image_url=?, price_cents=? WHERE id=?", updates)
+        cur.executemany(
+            "INSERT INTO items (box_id, name, confidence, image_url, price_cents, added_at, canonical_name) "
+            "VALUES (?,?,?,?,?,?,?)",
+            inserts,
+        )
+        con.commit()
+    finally:
+        con.close()
+    stats.update(inserted=len(inserts), updated=len(renames) + len(updates), deleted=len(current))
+    return stats
+
+@timed("db.get_item_aliases")
+def get_item_aliases():
+    con = get_db()
+    rows = con.execute("SELECT alias, canonical FROM item_aliases ORDER BY canonical, alias").fetchall()
+    con.close()
+    return rows
+
+@timed("db.set_item_alias")
+def set_item_alias(alias: str, canonical: Optional[str]) -> int:
     """
+    Add/replace (or with canonical=None, remove) an alias and re-normalize
+    every item in the same transaction. Returns the number of items whose
+    canonical name changed.
+    """
+    from .schema import normalize_item_names
+
+    alias = basic_form(alias)
+    canonical = basic_form(canonical) if canonical is not None else None
     con = get_db()
-    terms = [t for t in (q or "").strip().split() if t]
-    params = []
+    try:
+        con.execute("BEGIN IMMEDIATE")
+        # older rows may hold the alias as typed ('Xmas'); replace every spelling that folds the same
+        same = [r["alias"] for r in con.execute("SELECT alias FROM item_aliases") if basic_form(r["alias"]) == alias]
+        con.executemany("DELETE FROM item_aliases WHERE alias=?", [(a,) for a in same])
+        if canonical is not None:
+            con.execute(
+                "INSERT INTO item_aliases (alias, canonical, created_at) VALUES (?,?,?)",
+                (alias, canonical, datetime.utcnow().isoformat(timespec="seconds")),
+            )
+        changed = normalize_item_names(con)
+        con.commit()
+    finally:
+        con.close()
+    invalidate_matcher()
+    return changed
 
-    sql = """
-        SELECT
+_SEARCH_COLUMNS = """
+          i.id          AS item_id,
           i.name        AS item_name,
           i.confidence  AS confidence,
           i.image_url   AS image_url,
@@ -82,28 +389,98 @@ def search_items(q: str):
           i.added_at    AS added_at,
           b.id          AS box_id,
           b.name        AS box_name
-        FROM items i
-        JOIN boxes b ON b.id = i.box_id
-    """
+"""
 
-    if terms:
-        # (i.name LIKE ? OR b.name LIKE ?) AND (i.name LIKE ? OR b.name LIKE ?) ...
-        where_clauses = []
-        for t in terms:
-            like = f"%{t}%"
-            where_clauses.append("(i.name LIKE ? COLLATE NOCASE OR b.name LIKE ? COLLATE NOCASE)")
-            params.extend([like, like])
-        sql += " WHERE " + " AND ".join(where_clauses)
-    else:
-        # empty query → just show most recent items
-        sql += " WHERE 1=1"
+def _fts_query(terms: List[str]) -> str:
+    # every token is a quoted prefix match; FTS5 ANDs adjacent terms
+    return " ".join('"' + t.replace('"', '""') + '"*' for t in terms)
 
-    sql += " ORDER BY i.confidence DESC, i.id DESC LIMIT 500"
+@timed("db.search_items")
+def search_items(q: str, limit: int = 48, cursor: Optional[str] = None):
+    """
+    Tokenized, case-insensitive search across item AND box names.
+    'steel pot' => AND across tokens; each token may prefix-match item or box.
+    Uses the items_fts index (BM25, weighted by confidence) when available,
+    otherwise falls back to LIKE scans.
+    Keyset-paginated: returns (rows, next_cursor); pass next_cursor back with
+    the same q for the following page.
+    """
+    con = get_db()
+    terms = re.findall(r"\w+", q or "")
+    after = None
+    if cursor:
+        # ("s", bm25 score, item id) from the FTS path, ("c", confidence, item id) otherwise
+        after = decode_cursor(cursor, str, (int, float), int)
+        if after[0] not in (("s", "c") if terms else ("c",)):
+            raise ValueError("invalid cursor")
 
-    rows = con.execute(sql, params).fetchall()
+    try:
+        if not terms:
+            # empty query → just show most recent items
+            rows = _search_items_recent(con, limit + 1, after)
+        else:
+            rows = _search_items_fts(con, terms, limit + 1, after)
+    except sqlite3.OperationalError:
+        rows = _search_items_like(con, terms, limit + 1, after)
     con.close()
-    return rows
 
+    next_cursor = None
+    if len(rows) > limit:
+        last = rows[limit - 1]
+        if "score" in last.keys():
+            next_cursor = encode_cursor("s", last["score"], last["item_id"])
+        else:
+            next_cursor = encode_cursor("c", last["confidence"], last["item_id"])
+    return rows[:limit], next_cursor
+
+def _search_items_recent(con, limit: int, after: Optional[list]):
+    sql = f"SELECT {_SEARCH_COLUMNS} FROM items i JOIN boxes b ON b.id = i.box_id"
+    params: list = []
+    if after:
+        _, conf, item_id = after
+        sql += " WHERE (i.confidence, i.id) < (?, ?)"
+        params += [conf, item_id]
+    sql += " ORDER BY i.confidence DESC, i.id DESC LIMIT ?"
+    return con.execute(sql, params + [limit]).fetchall()
+
+def _search_items_fts(con, terms: List[str], limit: int, after: Optional[list]):
+    # bm25() is negative (lower = better); scaling by confidence lets
+    # sure detections outrank lucky text matches. Item names weigh 2x box names.
+    sql = f"""
+        SELECT {_SEARCH_COLUMNS},
+          bm25(items_fts, 2.0, 1.0) * (1.0 + COALESCE(i.confidence, 0)) AS score
+        FROM items_fts f
+        JOIN items i ON i.id = f.rowid
+        JOIN boxes b ON b.id = i.box_id
+        WHERE items_fts MATCH ?
+    """
+    params: list = [_fts_query(terms)]
+    if after:
+        _, score, item_id = after
+        sql += " AND (score > ? OR (score = ? AND i.id < ?))"
+        params += [score, score, item_id]
+    sql += " ORDER BY score, i.id DESC LIMIT ?"
+    return con.execute(sql, params + [limit]).fetchall()
+
+def _search_items_like(con, terms: List[str], limit: int, after: Optional[list]):
+    # (i.name LIKE ? OR b.name LIKE ?) AND (i.name LIKE ? OR b.name LIKE ?) ...
+    where_clauses = []
+    params: list = []
+    for t in terms:
+        like = f"%{t}%"
+        where_clauses.append("(i.name LIKE ? COLLATE NOCASE OR b.name LIKE ? COLLATE NOCASE)")
+        params.extend([like, like])
+    if after:
+        _, conf, item_id = after
+        where_clauses.append("(i.confidence, i.id) < (?, ?)")
+        params += [conf, item_id]
+    sql = f"SELECT {_SEARCH_COLUMNS} FROM items i JOIN boxes b ON b.id = i.box_id"
+    if where_clauses:
+        sql += " WHERE " + " AND ".join(where_clauses)
+    sql += " ORDER BY i.confidence DESC, i.id DESC LIMIT ?"
+    return con.execute(sql, params + [limit]).fetchall()
+
+@timed("db.delete_box_and_children")
 def delete_box_and_children(box_id: int) -> Optional[str]:
     """Returns photo filename (if any) to delete from disk."""
     con = get_db()
@@ -111,9 +488,114 @@ def delete_box_and_children(box_id: int) -> Optional[str]:
     row = cur.execute("SELECT photo FROM boxes WHERE id=?", (box_id,)).fetchone()
     photo = dict(row).get("photo") if row else None
     cur.execute("PRAGMA foreign_keys = OFF")
+    # drop the aggregate row first so the per-item delete triggers have nothing to update
+    cur.execute("DELETE FROM box_stats WHERE box_id=?", (box_id,))
     cur.execute("DELETE FROM items WHERE box_id=?", (box_id,))
     cur.execute("DELETE FROM boxes WHERE id=?", (box_id,))
     con.commit()
     cur.execute("PRAGMA foreign_keys = ON")
     con.close()
     return photo
+
+# ---------- export ----------
+
+EXPORT_COLUMNS = ["item_id", "box_id", "box_name", "item_name", "canonical_name",
+                  "confidence", "price_cents", "image_url", "added_at"]
+
+def iter_inventory(after_id: int = 0, chunk_size: int = 1000) -> Iterator[List[sqlite3.Row]]:
+    """
+    Every item joined with its box, in item id order, as lists of up to
+    chunk_size rows. One statement read with fetchmany, so the export is a
+    single snapshot and memory stays at one chunk. after_id resumes a
+    previous export (its last item_id).
+    """
+    con = get_db()
+    try:
+        cur = con.execute(
+            "SELECT i.id AS item_id, i.box_id, b.name AS box_name, i.name AS item_name, i.canonical_name, "
+            "i.confidence, i.price_cents, i.image_url, i.added_at "
+            "FROM items i JOIN boxes b ON b.id = i.box_id WHERE i.id > ? ORDER BY i.id",
+            (int(after_id),),
+        )
+        while True:
+            rows = cur.fetchmany(chunk_size)
+            if not rows:
+                break
+            yield rows
+    finally:
+        con.close()
+
+# ---------- background jobs ----------
+
+def _insert_job(cur, kind: str, box_id: Optional[int], payload: Optional[dict], max_attempts: int) -> int:
+    now = datetime.utcnow().isoformat(timespec="seconds")
+    cur.execute(
+        "INSERT INTO jobs (kind, box_id, payload, status, max_attempts, run_after, created_at, updated_at) "
+        "VALUES (?,?,?,'queued',?,?,?,?)",
+        (kind, box_id, json.dumps(payload or {}), max_attempts, time.time(), now, now),
+    )
+    return cur.lastrowid
+
+@timed("db.enqueue_job")
+def enqueue_job(kind: str, box_id: Optional[int], payload: Optional[dict] = None,
+                max_attempts: int = 3) -> int:
+    con = get_db()
+    cur = con.cursor()
+    job_id = _insert_job(cur, kind, box_id, payload, max_attempts)
+    con.commit()
+    con.close()
+    return job_id
+
+@timed("db.claim_job")
+def claim_job(stale_after_s: float) -> Optional[dict]:
+    """
+    Atomically take the oldest runnable job (queued and due, or running but
+    abandoned by a dead worker) and mark it running. Safe across processes.
+    """
+    con = get_db()
+    now = time.time()
+    try:
+        con.execute("BEGIN IMMEDIATE")
+        row = con.execute(
+            "SELECT id FROM jobs "
+            "WHERE (status='queued' AND run_after<=?) OR (status='running' AND locked_at<?) "
+            "ORDER BY id ASC LIMIT 1",
+            (now, now - stale_after_s),
+        ).fetchone()
+        job = None
+        if row:
+            con.execute(
+                "UPDATE jobs SET status='running', attempts=attempts+1, locked_at=?, updated_at=? WHERE id=?",
+                (now, datetime.utcnow().isoformat(timespec="seconds"), row["id"]),
+            )
+            job = dict(con.execute("SELECT * FROM jobs WHERE id=?", (row["id"],)).fetchone())
+            job["payload"] = json.loads(job.get("payload") or "{}")
+        con.commit()
+    finally:
+        con.close()
+    return job
+
+@timed("db.finish_job")
+def finish_job(job_id: int, status: str = "done", error: Optional[str] = None,
+               retry_in_s: Optional[float] = None):
+    """status='done'|'failed', or pass retry_in_s to put it back in the queue."""
+    con = get_db()
+    if retry_in_s is not None:
+        status = "queued"
+    con.execute(
+        "UPDATE jobs SET status=?, last_error=?, run_after=?, locked_at=NULL, updated_at=? WHERE id=?",
+        (status, error, time.time() + (retry_in_s or 0), datetime.utcnow().isoformat(timespec="seconds"), job_id),
+    )
+    con.commit()
+    con.close()
+
+@timed("db.get_box_jobs")
+def get_box_jobs(box_id: int):
+    con = get_db()
+    rows = con.execute(
+        "SELECT id, kind, status, attempts, max_attempts, last_error, created_at, updated_at "
+        "FROM jobs WHERE box_id=? ORDER BY id ASC",
+        (box_id,),
+    ).fetchall()
+    con.close()
+    return rows
@@ -1,18 +1,57 @@
+import sqlite3
+from datetime import datetime
+from typing import Callable, List, Tuple
+
 from .connection import get_db
 
-def init_db():
-    con = get_db()
-    cur = con.cursor()
-    cur.execute("""
+# Full-text index over item + box names, kept in sync by triggers so every
+# writer (routes, jobs, ad-hoc SQL) updates it. rowid == items.id.
+SEARCH_INDEX_DDL = [
+    """
+    CREATE VIRTUAL TABLE IF NOT EXISTS items_fts USING fts5(
+        item_name, box_name,
+        tokenize = 'unicode61 remove_diacritics 2',
+        prefix = '2 3'
+    )
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS items_fts_ai AFTER INSERT ON items BEGIN
+        INSERT INTO items_fts (rowid, item_name, box_name)
+        VALUES (new.id, new.name, (SELECT name FROM boxes WHERE id = new.box_id));
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS items_fts_ad AFTER DELETE ON items BEGIN
+        DELETE FROM items_fts WHERE rowid = old.id;
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS items_fts_au AFTER UPDATE OF name, box_id ON items BEGIN
+        DELETE FROM items_fts WHERE rowid = old.id;
+        INSERT INTO items_fts (rowid, item_name, box_name)
+        VALUES (new.id, new.name, (SELECT name FROM boxes WHERE id = new.box_id));
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS boxes_fts_au AFTER UPDATE OF name ON boxes BEGIN
+        UPDATE items_fts SET box_name = new.name
+        WHERE rowid IN (SELECT id FROM items WHERE box_id = new.id);
+    END
+    """,
+]
+
+def _create_base_tables(con):
+    con.execute("""
         CREATE TABLE IF NOT EXISTS boxes (
             id INTEGER PRIMARY KEY AUTOINCREMENT,
             name TEXT NOT NULL,
             photo TEXT,
             notes TEXT,
+            status TEXT,
             created_at TEXT NOT NULL
         )
     """)
-    cur.execute("""
+    con.execute("""
         CREATE TABLE IF NOT EXISTS items (
             id INTEGER PRIMARY KEY AUTOINCREMENT,
             box_id INTEGER NOT NULL,
@@ -24,18 +63,352 @@ def init_db():
             FOREIGN KEY (box_id) REFERENCES boxes(id) ON DELETE CASCADE
         )
     """)
-    con.commit()
-    con.close()
+    con.execute("""
+        CREATE TABLE IF NOT EXISTS jobs (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            kind TEXT NOT NULL,
+            box_id INTEGER,
+            payload TEXT,
+            status TEXT NOT NULL DEFAULT 'queued',
+            attempts INTEGER NOT NULL DEFAULT 0,
+            max_attempts INTEGER NOT NULL DEFAULT 3,
+            last_error TEXT,
+            run_after REAL NOT NULL DEFAULT 0,
+            locked_at REAL,
+            created_at TEXT NOT NULL,
+            updated_at TEXT
+        )
+    """)
+    con.execute("""
+        CREATE TABLE IF NOT EXISTS lookup_cache (
+            kind TEXT NOT NULL,
+            key TEXT NOT NULL,
+            value TEXT,
+            expires_at REAL NOT NULL,
+            PRIMARY KEY (kind, key)
+        )
+    """)
 
-def migrate_db():
-    con = get_db()
+def _add_legacy_columns(con):
+    # databases created before these columns existed (incl. the old SQLAlchemy schema)
     for table, cols in {
-        "boxes": ["photo", "notes"],
+        "boxes": ["photo", "notes", "status"],
         "items": ["image_url", "price_cents", "added_at"],
     }.items():
         existing = {r["name"] for r in con.execute(f"PRAGMA table_info({table})")}
         for col in cols:
             if col not in existing:
                 con.execute(f"ALTER TABLE {table} ADD COLUMN {col} {'TEXT' if col!='price_cents' else 'INTEGER'}")
+
+def has_search_index(con) -> bool:
+    return con.execute(
+        "SELECT 1 FROM sqlite_master WHERE type='table' AND name='items_fts'"
+    ).fetchone() is not None
+
+def rebuild_search_index(con) -> None:
+    con.execute("DELETE FROM items_fts")
+    con.execute(
+        "INSERT INTO items_fts (rowid, item_name, box_name) "
+        "SELECT i.id, i.name, b.name FROM items i JOIN boxes b ON b.id = i.box_id"
+    )
+
+def _create_search_index(con):
+    """FTS5 index + triggers, backfilled on first creation. Skipped without FTS5."""
+    existed = has_search_index(con)
+    con.execute("SAVEPOINT search_index")
+    try:
+        for ddl in SEARCH_INDEX_DDL:
+            con.execute(ddl)
+        if not existed:
+            rebuild_search_index(con)
+    except sqlite3.OperationalError:
+        # sqlite built without FTS5: search_items falls back to LIKE
+        con.execute("ROLLBACK TO search_index")
+    con.execute("RELEASE search_index")
+
+def _create_hot_path_indexes(con):
+    # get_items / get_unenriched_items: WHERE box_id=? ORDER BY id
+    con.execute("CREATE INDEX IF NOT EXISTS idx_items_box_id ON items (box_id, id)")
+    # search_items with an empty query: ORDER BY confidence DESC, id DESC LIMIT n
+    con.execute("CREATE INDEX IF NOT EXISTS idx_items_confidence ON items (confidence DESC, id DESC)")
+    # claim_job / get_box_jobs
+    con.execute("CREATE INDEX IF NOT EXISTS idx_jobs_status ON jobs (status, run_after)")
+    con.execute("CREATE INDEX IF NOT EXISTS idx_jobs_box_id ON jobs (box_id)")
+
+def _backfill_null_confidence(con):
+    # keyset pagination compares (confidence, id); NULLs would drop out of pages
+    con.execute("UPDATE items SET confidence = 0 WHERE confidence IS NULL")
+
+def _add_photo_variants(con):
+    # JSON list of thumbnail widths stored next to the photo; NULL = not generated yet
+    con.execute("ALTER TABLE boxes ADD COLUMN photo_variants TEXT")
+
+def _add_photo_hashes(con):
+    # sha256 of the uploaded bytes (photo keys are content-addressed from here
+    # on) and an optional 64-bit dHash for finding near-duplicates later
+    con.execute("ALTER TABLE boxes ADD COLUMN photo_sha256 TEXT")
+    con.execute("ALTER TABLE boxes ADD COLUMN photo_phash TEXT")
+    con.execute("CREATE INDEX IF NOT EXISTS idx_boxes_photo_sha256 ON boxes(photo_sha256)")
+
+# Starter synonyms; add more with `flask item-alias ALIAS CANONICAL`.
+DEFAULT_ITEM_ALIASES = [
+    ("stainless steel", "steel"),
+    ("stainless", "steel"),
+    ("flash light", "flashlight"),
+    ("torch", "flashlight"),
+    ("extension cable", "extension cord"),
+    ("power cord", "extension cord"),
+    ("xmas", "christmas"),
+]
+
+def normalize_item_names(con) -> int:
+    """Recompute items.canonical_name from the current alias table; returns rows changed."""
+    from services.normalize import NameMatcher, load_aliases
+
+    con.create_function("canonical_name", 1, NameMatcher(load_aliases(con)).canonical, deterministic=True)
+    return con.execute(
+        "UPDATE items SET canonical_name = canonical_name(name) "
+        "WHERE canonical_name IS NOT canonical_name(name)"
+    ).rowcount
+
+def _add_canonical_names(con):
+    # normalized item name (case, plurals, synonyms) for dedupe, cache keys and aggregates
+    con.execute(
+        "CREATE TABLE IF NOT EXISTS item_aliases ("
+        "alias TEXT PRIMARY KEY, canonical TEXT NOT NULL, created_at TEXT NOT NULL)"
+    )
+    now = datetime.utcnow().isoformat(timespec="seconds")
+    con.executemany(
+        "INSERT OR IGNORE INTO item_aliases (alias, canonical, created_at) VALUES (?,?,?)",
+        [(a, c, now) for a, c in DEFAULT_ITEM_ALIASES],
+    )
+    con.execute("ALTER TABLE items ADD COLUMN canonical_name TEXT")
+    con.execute("CREATE INDEX IF NOT EXISTS idx_items_canonical ON items (box_id, canonical_name)")
+    normalize_item_names(con)
+
+# Per-box aggregates for the index cards and the inventory summary, kept in
+# sync by triggers like the search index. Inserts are applied incrementally;
+# deletes/updates re-scan the box (idx_items_box_id) only when they remove the
+# current max. Boxes that never had items have no row (read as zeros).
+BOX_STATS_DDL = [
+    """
+    CREATE TABLE IF NOT EXISTS box_stats (
+        box_id INTEGER PRIMARY KEY,
+        item_count INTEGER NOT NULL DEFAULT 0,
+        total_price_cents INTEGER NOT NULL DEFAULT 0,
+        max_confidence REAL,
+        last_added_at TEXT
+    )
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS box_stats_ai AFTER INSERT ON items BEGIN
+        INSERT INTO box_stats (box_id, item_count, total_price_cents, max_confidence, last_added_at)
+        VALUES (new.box_id, 1, COALESCE(new.price_cents, 0), new.confidence, new.added_at)
+        ON CONFLICT (box_id) DO UPDATE SET
+            item_count = item_count + 1,
+            total_price_cents = total_price_cents + excluded.total_price_cents,
+            max_confidence = MAX(COALESCE(max_confidence, excluded.max_confidence), COALESCE(excluded.max_confidence, max_confidence)),
+            last_added_at = MAX(COALESCE(last_added_at, excluded.last_added_at), COALESCE(excluded.last_added_at, last_added_at));
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS box_stats_ad AFTER DELETE ON items BEGIN
+        UPDATE box_stats SET
+            item_count = item_count - 1,
+            total_price_cents = total_price_cents - COALESCE(old.price_cents, 0),
+            max_confidence = CASE WHEN old.confidence < max_confidence THEN max_confidence
+                ELSE (SELECT MAX(confidence) FROM items WHERE box_id = old.box_id) END,
+            last_added_at = CASE WHEN old.added_at < last_added_at THEN last_added_at
+                ELSE (SELECT MAX(added_at) FROM items WHERE box_id = old.box_id) END
+        WHERE box_id = old.box_id;
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS box_stats_au AFTER UPDATE OF box_id, confidence, price_cents, added_at ON items BEGIN
+        UPDATE box_stats SET
+            item_count = item_count - 1,
+            total_price_cents = total_price_cents - COALESCE(old.price_cents, 0),
+            max_confidence = CASE WHEN old.confidence < max_confidence THEN max_confidence
+                ELSE (SELECT MAX(confidence) FROM items WHERE box_id = old.box_id AND id != new.id) END,
+            last_added_at = CASE WHEN old.added_at < last_added_at THEN last_added_at
+                ELSE (SELECT MAX(added_at) FROM items WHERE box_id = old.box_id AND id != new.id) END
+        WHERE box_id = old.box_id;
+        INSERT INTO box_stats (box_id, item_count, total_price_cents, max_confidence, last_added_at)
+        VALUES (new.box_id, 1, COALESCE(new.price_cents, 0), new.confidence, new.added_at)
+        ON CONFLICT (box_id) DO UPDATE SET
+            item_count = item_count + 1,
+            total_price_cents = total_price_cents + excluded.total_price_cents,
+            max_confidence = MAX(COALESCE(max_confidence, excluded.max_confidence), COALESCE(excluded.max_confidence, max_confidence)),
+            last_added_at = MAX(COALESCE(last_added_at, excluded.last_added_at), COALESCE(excluded.last_added_at, last_added_at));
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS box_stats_box_ad AFTER DELETE ON boxes BEGIN
+        DELETE FROM box_stats WHERE box_id = old.id;
+    END
+    """,
+]
+
+_EXPECTED_BOX_STATS = """
+    SELECT box_id, COUNT(*) AS item_count, COALESCE(SUM(price_cents), 0) AS total_price_cents,
+           MAX(confidence) AS max_confidence, MAX(added_at) AS last_added_at
+    FROM items GROUP BY box_id
+"""
+
+def rebuild_box_stats(con) -> None:
+    con.execute("DELETE FROM box_stats")
+    con.execute(
+        "INSERT INTO box_stats (box_id, item_count, total_price_cents, max_confidence, last_added_at) "
+        + _EXPECTED_BOX_STATS
+    )
+
+def check_box_stats(con) -> List[int]:
+    """Box ids whose box_stats row disagrees with their items (empty list = consistent)."""
+    rows = con.execute(f"""
+        WITH expected AS ({_EXPECTED_BOX_STATS}),
+             actual AS (SELECT * FROM box_stats WHERE item_count != 0)
+        SELECT e.box_id FROM expected e LEFT JOIN actual a ON a.box_id = e.box_id
+        WHERE a.box_id IS NULL OR e.item_count != a.item_count
+           OR e.total_price_cents != a.total_price_cents
+           OR e.max_confidence IS NOT a.max_confidence OR e.last_added_at IS NOT a.last_added_at
+        UNION
+        SELECT a.box_id FROM actual a LEFT JOIN expected e ON e.box_id = a.box_id WHERE e.box_id IS NULL
+        ORDER BY 1
+    """).fetchall()
+    return [r[0] for r in rows]
+
+def _create_box_stats(con):
+    for ddl in BOX_STATS_DDL:
+        con.execute(ddl)
+    rebuild_box_stats(con)
+
+# Change counters behind the pages' ETags: boxes.version moves whenever the
+# box or one of its displayed items changes, inventory_version whenever any
+# box does. Triggers again, so no writer can forget to bump them.
+VERSION_DDL = [
+    """
+    CREATE TABLE IF NOT EXISTS inventory_version (
+        id INTEGER PRIMARY KEY CHECK (id = 1),
+        version INTEGER NOT NULL
+    )
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS items_version_ai AFTER INSERT ON items BEGIN
+        UPDATE boxes SET version = version + 1 WHERE id = new.box_id;
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS items_version_ad AFTER DELETE ON items BEGIN
+        UPDATE boxes SET version = version + 1 WHERE id = old.box_id;
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS items_version_au
+    AFTER UPDATE OF box_id, name, confidence, image_url, price_cents ON items BEGIN
+        UPDATE boxes SET version = version + 1 WHERE id IN (old.box_id, new.box_id);
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS boxes_version_au
+    AFTER UPDATE OF name, photo, photo_variants, notes, status ON boxes BEGIN
+        UPDATE boxes SET version = version + 1 WHERE id = new.id;
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS inventory_version_box_ai AFTER INSERT ON boxes BEGIN
+        UPDATE inventory_version SET version = version + 1;
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS inventory_version_box_ad AFTER DELETE ON boxes BEGIN
+        UPDATE inventory_version SET version = version + 1;
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS inventory_version_box_au AFTER UPDATE OF version ON boxes BEGIN
+        UPDATE inventory_version SET version = version + 1;
+    END
+    """,
+]
+
+def _add_versions(con):
+    con.execute("ALTER TABLE boxes ADD COLUMN version INTEGER NOT NULL DEFAULT 1")
+    for ddl in VERSION_DDL:
+        con.execute(ddl)
+    con.execute("INSERT OR IGNORE INTO inventory_version (id, version) VALUES (1, 1)")
+
+# Append-only: (version, name, step). Each step runs once, in its own
+# transaction, and is recorded in schema_migrations. Steps must tolerate
+# databases that already have their objects (pre-migration installs).
+MIGRATIONS: List[Tuple[int, str, Callable]] = [
+    (1, "base_tables", _create_base_tables),
+    (2, "legacy_columns", _add_legacy_columns),
+    (3, "search_index", _create_search_index),
+    (4, "hot_path_indexes", _create_hot_path_indexes),
+    (5, "backfill_null_confidence", _backfill_null_confidence),
+    (6, "photo_variants", _add_photo_variants),
+    (7, "photo_hashes", _add_photo_hashes),
+    (8, "canonical_item_names", _add_canonical_names),
+    (9, "box_stats", _create_box_stats),
+    (10, "versions", _add_versions),
+    # basic_form now singularizes every word, and alias keys fold the same way
+    (11, "renormalize_item_names", normalize_item_names),
+]
+
+def run_migrations() -> List[int]:
+    """Apply pending migrations; returns the versions applied this call."""
+    con = get_db()
+    con.execute(
+        "CREATE TABLE IF NOT EXISTS schema_migrations ("
+        "version INTEGER PRIMARY KEY, name TEXT NOT NULL, applied_at TEXT NOT NULL)"
+    )
     con.commit()
+    applied = {r["version"] for r in con.execute("SELECT version FROM schema_migrations")}
+    done: List[int] = []
+    for version, name, step in MIGRATIONS:
+        if version in applied:
+            continue
+        try:
+            # IMMEDIATE serializes gunicorn workers booting at the same time
+            con.execute("BEGIN IMMEDIATE")
+            if con.execute("SELECT 1 FROM schema_migrations WHERE version=?", (version,)).fetchone():
+                con.rollback()
+                continue
+            step(con)
+            con.execute(
+                "INSERT INTO schema_migrations (version, name, applied_at) VALUES (?,?,?)",
+                (version, name, datetime.utcnow().isoformat(timespec="seconds")),
+            )
+            con.commit()
+        except Exception:
+            con.rollback()
+            raise
+        done.append(version)
+    con.close()
+    return done
+
+# Hot queries that must stay index-backed; see check_query_plans().
+HOT_QUERIES = {
+    "get_items": "SELECT * FROM items WHERE box_id=1 ORDER BY id ASC",
+    "recent_items": (
+        "SELECT i.id FROM items i JOIN boxes b ON b.id = i.box_id "
+        "ORDER BY i.confidence DESC, i.id DESC LIMIT 500"
+    ),
+    "box_jobs": "SELECT id FROM jobs WHERE box_id=1 ORDER BY id ASC",
+}
+
+def check_query_plans() -> List[str]:
+    """
+    EXPLAIN QUERY PLAN each hot query; returns a list of problems (full table
+    scans of items/jobs or temp b-tree sorts). Empty list means all good.
+    """
+    con = get_db()
+    problems = []
+    for name, sql in HOT_QUERIES.items():
+        plan = [r["detail"] for r in con.execute("EXPLAIN QUERY PLAN " + sql)]
+        for detail in plan:
+            full_scan = detail.startswith("SCAN") and "USING" not in detail and "boxes" not in detail
+            if full_scan or "TEMP B-TREE" in detail:
+                problems.append(f"{name}: {detail}")
     con.close()
+    return problems
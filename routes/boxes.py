@@ -1,16 +1,15 @@
 # routes/boxes.py
 from __future__ import annotations
 
+import json
 import os
 import tempfile
-from io import BytesIO
 from pathlib import Path
 from typing import List, Tuple, MutableMapping, Any
-from uuid import uuid4
-from storage_s3 import presigned_url
 
 from flask import (
     Blueprint,
+    jsonify,
     render_template,
     request,
     redirect,
@@ -19,25 +18,37 @@ from flask import (
     abort,
 )
 
-from werkzeug.utils import secure_filename
-
 # DB & services
 from db.queries import (
     list_boxes,
+    inventory_summary,
+    get_inventory_version,
+    get_box_version,
     get_box,
     insert_box,
     update_box_name,
     get_items,
-    insert_item,
     replace_items,
     delete_box_and_children,
+    get_box_jobs,
+)
+from services.enrich import clamp_confidence, enrich_items
+from services.hashing import content_key
+from services.http_cache import not_modified, page_etag, render_fragment, with_etag
+from services.jobs import (
+    ANALYZE,
+    drop_spool,
+    enqueue,
+    insert_boxes_with_jobs,
+    request_thumbnails,
+    spool_upload,
+    store_photo,
 )
-from services.images import best_image_for_name
-from services.pricing import local_price_cents
-from services.vision import detect_items_json
+from services.normalize import canonical_name
+from services.thumbnails import variant_key
 
 # S3 helpers (no ACLs; presign for display)
-from storage_s3 import upload_fileobj, presigned_url
+from storage_s3 import presign_window, presigned_url, presigned_urls
 
 bp = Blueprint("boxes", __name__)
 
@@ -47,32 +58,92 @@ TMP_DIR.mkdir(parents=True, exist_ok=True)  # safe if already exists
 
 # ---------- helpers ----------
 
+PHOTO_URL_EXPIRES = 60 * 60 * 24
+
+def _is_legacy_url(photo_value) -> bool:
+    # If DB still has a full URL from older rows, use it as-is.
+    return isinstance(photo_value, str) and photo_value.startswith("http")
+
 def display_url(photo_value: str | None):
     if not photo_value:
         return None
-    # If DB still has a full URL from older rows, use it as-is.
-    if isinstance(photo_value, str) and photo_value.startswith("http"):
+    if _is_legacy_url(photo_value):
         return photo_value
     # Otherwise it's an S3 key -> presign
-    return presigned_url(photo_value, expires=60 * 60 * 24)
+    return presigned_url(photo_value, expires=PHOTO_URL_EXPIRES)
+
+def display_urls(photo_values) -> dict:
+    """display_url for a whole page of boxes, presigned in one batch."""
+    keys = [p for p in photo_values if p and not _is_legacy_url(p)]
+    urls = presigned_urls(keys, expires=PHOTO_URL_EXPIRES)
+    return {p: (p if _is_legacy_url(p) else urls.get(p)) for p in photo_values if p}
+
+def _int_or_none(value) -> int | None:
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        return None
+
+
+def _variant_widths(box_row) -> List[int]:
+    try:
+        return [int(w) for w in json.loads(box_row.get("photo_variants") or "[]")]
+    except (TypeError, ValueError):
+        return []
+
+def _attach_photo_urls(boxes: List[MutableMapping[str, Any]]) -> None:
+    """
+    Add transient 'photo_url' and 'photo_srcset' fields for templates, with
+    every key on the page presigned in one batch. S3 photos that have never
+    had thumbnails get them queued (lazy backfill for older boxes).
+    """
+    photos = [b.get("photo") for b in boxes]
+    variant_keys = {}
+    for b in boxes:
+        key = b.get("photo")
+        if not key or _is_legacy_url(key):
+            continue
+        if b.get("photo_variants") is None:
+            request_thumbnails(b["id"], key)
+        variant_keys[b["id"]] = [(w, variant_key(key, w)) for w in _variant_widths(b)]
+    urls = display_urls(photos + [k for pairs in variant_keys.values() for _, k in pairs])
+    for b in boxes:
+        b["photo_url"] = urls.get(b.get("photo"))
+        pairs = variant_keys.get(b["id"]) or []
+        b["photo_srcset"] = ", ".join(f"{urls[k]} {w}w" for w, k in pairs if urls.get(k)) or None
 
 def _ensure_photo_url_on_box(box_row: MutableMapping[str, Any]) -> None:
     """
-    Given a dict-like row with 'photo' holding the S3 key, add a transient
-    'photo_url' presigned URL field for templates.
+    Given a dict-like row with 'photo' holding the S3 key, add transient
+    'photo_url' / 'photo_srcset' presigned URL fields for templates.
     """
-    key = box_row.get("photo")
-    box_row["photo_url"] = presigned_url(key) if key else None
+    _attach_photo_urls([box_row])
 
 
 # ---------- routes ----------
 
+BOXES_PAGE_SIZE = int(os.getenv("BOXES_PAGE_SIZE", "48"))
+
 @bp.route("/")
 def index():
-    boxes = [dict(b) for b in list_boxes()]
+    cursor = request.args.get("cursor") or None
+    etag = page_etag("index", get_inventory_version(), cursor, presign_window(PHOTO_URL_EXPIRES))
+    cached = not_modified(etag)
+    if cached:
+        return cached
+    try:
+        rows, next_cursor = list_boxes(limit=BOXES_PAGE_SIZE, cursor=cursor)
+    except ValueError:
+        abort(400)
+    boxes = [dict(b) for b in rows]
+    _attach_photo_urls(boxes)
     for b in boxes:
-        b["photo_url"] = display_url(b.get("photo"))
-    return render_template("index.html", boxes=boxes)
+        # unchanged cards (same version and presigned URLs) skip template rendering
+        b["card_html"] = render_fragment("components/box_card.html",
+                                         (b["id"], b["version"], b["photo_url"], b["photo_srcset"]), box=b)
+    html = render_template("index.html", boxes=boxes, next_cursor=next_cursor, paged=bool(cursor),
+                           summary=inventory_summary())
+    return with_etag(html, etag)
 
 @bp.route("/new", methods=["GET", "POST"])
 def new_box():
@@ -90,66 +161,73 @@ def new_box():
         flash("Please upload JPG/PNG/WEBP.")
         return redirect(url_for("boxes.new_box"))
 
-    # read once into memory
-    data = file.read()
-    if not data:
+    # ---- park the upload and hand off to the job queue ----
+    # streamed to disk (and hashed) in chunks; vision, the S3 upload and
+    # enrichment all run on a background worker and the detail page polls
+    # /box/<id>/status as they finish.
+    spool_path, sha256, size = spool_upload(file.stream, ext, name="new")
+    if not size:
+        drop_spool(spool_path)
         flash("Uploaded file is empty.")
         return redirect(url_for("boxes.new_box"))
 
-    # ---- run vision on a temp file ----
-    with tempfile.NamedTemporaryFile(suffix=ext, delete=False) as tmp:
-        tmp.write(data)
-        tmp_path = tmp.name
+    box_id = insert_box(name="Analyzing…", photo=None, notes="", status="analyzing")
+    enqueue(ANALYZE, box_id, {
+        "path": spool_path,
+        "key": content_key(sha256, ext),
+        "content_type": file.mimetype or "image/jpeg",
+        "sha256": sha256,
+    })
 
-    try:
-        result = detect_items_json(tmp_path)
-    except Exception as e:
-        # don't block creation if vision fails
-        result = {"box_name": "Unlabeled Box", "items": [], "notes": f"(analysis failed: {e})"}
-    finally:
-        try:
-            os.remove(tmp_path)
-        except Exception:
-            pass
-
-    # ---- upload original image to S3 (no ACLs; bucket enforces owner) ----
-    key_name = f"uploads/{uuid4().hex}_{secure_filename(file.filename or 'upload.jpg')}"
-    content_type = file.mimetype or "image/jpeg"
-
-    photo_key = upload_fileobj(
-        BytesIO(data),
-        key_name,
-        extra={"ContentType": content_type},  # no ACL
-    )
+    flash("Photo received — analyzing in the background.")
+    return redirect(url_for("boxes.box_detail", box_id=box_id))
 
-    # ---- persist to DB (store S3 key in 'photo' column) ----
-    box_id = insert_box(
-        name=(result.get("box_name") or "Unlabeled Box"),
-        photo=photo_key,  # store key, not URL
-        notes=result.get("notes", ""),
-    )
 
-    # persist detected items
-    for it in result.get("items", []):
-        name = (it.get("name") or "").strip()
-        if not name:
+@bp.post("/new/batch")
+def new_boxes_batch():
+    """
+    Many photos in one request: every valid file becomes a box queued for
+    analysis, all inserted in one transaction. The job workers bound how many
+    are analyzed at once. JSON for fetch() callers, else redirect to the list.
+    """
+    created, rejected = [], []
+    boxes = []
+    for file in request.files.getlist("photos"):
+        ext = os.path.splitext(file.filename or "")[1].lower()
+        if ext not in {".jpg", ".jpeg", ".png", ".webp"}:
+            rejected.append(file.filename)
+            continue
+        spool_path, sha256, size = spool_upload(file.stream, ext, name="batch")
+        if not size:
+            drop_spool(spool_path)
+            rejected.append(file.filename)
             continue
-        try:
-            conf = float(it.get("confidence") or 0.0)
-        except Exception:
-            conf = 0.0
-        img = best_image_for_name(name)
-        price = local_price_cents(name)
-        insert_item(
-            box_id=box_id,
-            name=name,
-            confidence=max(0.0, min(1.0, conf)),
-            image_url=img,
-            price_cents=price,
+        boxes.append({
+            "name": "Analyzing…",
+            "photo": None,
+            "status": "analyzing",
+            "job_kind": ANALYZE,
+            "payload": {
+                "path": spool_path,
+                "key": content_key(sha256, ext),
+                "content_type": file.mimetype or "image/jpeg",
+                "sha256": sha256,
+            },
+        })
+        created.append(file.filename)
+    ids = insert_boxes_with_jobs(boxes)
+
+    if request.accept_mimetypes.best == "application/json":
+        return jsonify(
+            boxes=[{"id": i, "filename": f, "url": url_for("boxes.box_detail", box_id=i)}
+                   for i, f in zip(ids, created)],
+            rejected=rejected,
         )
-
-    flash("Analyzed and saved.")
-    return redirect(url_for("boxes.box_detail", box_id=box_id))
+    if ids:
+        flash(f"{len(ids)} photo(s) received — analyzing in the background.")
+    if rejected:
+        flash(f"Skipped {len(rejected)} file(s) that were empty or not JPG/PNG/WEBP.")
+    return redirect(url_for("boxes.index"))
 
 
 @bp.route("/box/<int:box_id>", methods=["GET", "POST"])
@@ -160,47 +238,59 @@ def box_detail(box_id: int):
         if new_photo and new_photo.filename:
             ext = os.path.splitext(new_photo.filename)[1].lower()
             if ext in {".jpg", ".jpeg", ".png", ".webp"}:
-                new_key = f"uploads/{uuid4().hex}_{secure_filename(new_photo.filename)}"
                 content_type = new_photo.mimetype or "image/jpeg"
-
-                photo_key = upload_fileobj(
-                    new_photo.stream,
-                    new_key,
-                    extra={"ContentType": content_type},  # no ACL
-                )
-
-                # Update just the photo key
-                from db.connection import get_db
-                con = get_db()
-                con.execute("UPDATE boxes SET photo=? WHERE id=?", (photo_key, box_id))
-                con.commit()
-                con.close()
-                flash("Photo updated.")
+                spool_path, sha256, size = spool_upload(new_photo.stream, ext, name="thumb")
+                current = get_box(box_id)
+
+                if not size or (current and dict(current).get("photo_sha256") == sha256):
+                    drop_spool(spool_path)
+                    flash("Photo unchanged.")
+                else:
+                    # Upload (streamed from disk) only bytes S3 doesn't have yet;
+                    # thumbnails are built off-request from the same spool file
+                    stored_key = store_photo(box_id, spool_path, content_key(sha256, ext), content_type, sha256)
+                    request_thumbnails(box_id, stored_key, spool_path)
+                    flash("Photo updated.")
 
         # update name + items
         name = (request.form.get("name") or "Unnamed Box").strip()
-        update_box_name(box_id, name)
+        current = get_box(box_id)
+        if current and current["name"] != name:
+            update_box_name(box_id, name)
 
-        pairs: List[Tuple[str, float, str, int | None]] = []
+        submitted: List[dict] = []
         for k, v in request.form.items():
-            if k.startswith("items[") and k.endswith("].name"):
+            if k.startswith("items[") and k.endswith("].name") and v.strip():
                 idx = k.split("[", 1)[1].split("]")[0]
-                n = (v or "").strip()
-                try:
-                    c = float(request.form.get(f"items[{idx}].confidence", "0") or 0)
-                except Exception:
-                    c = 0.0
-                img = best_image_for_name(n) if n else ""
-                price = local_price_cents(n) if n else None
-                if n:
-                    pairs.append((n, max(0.0, min(1.0, c)), img, price))
-
-        if pairs:
-            replace_items(box_id, pairs)
+                submitted.append({
+                    "id": _int_or_none(request.form.get(f"items[{idx}].id")),
+                    "name": v.strip(),
+                    "confidence": request.form.get(f"items[{idx}].confidence", "0"),
+                })
+
+        if submitted:
+            # only new or renamed (to a different canonical name) items need
+            # image/price lookups; the rest keep theirs
+            known = {r["id"]: r["canonical_name"] for r in get_items(box_id)}
+            stale = [known.get(it["id"]) != canonical_name(it["name"]) for it in submitted]
+            looked_up = iter(enrich_items([it for it, s in zip(submitted, stale) if s]))
+            pairs: List[Tuple[str, float, str | None, int | None]] = [
+                next(looked_up) if s else (it["name"], clamp_confidence(it["confidence"]), None, None)
+                for it, s in zip(submitted, stale)
+            ]
+            replace_items(box_id, pairs, ids=[it["id"] for it in submitted])
 
         return redirect(url_for("boxes.box_detail", box_id=box_id))
 
     # GET branch
+    version = get_box_version(box_id)
+    if version is None:
+        abort(404)
+    etag = page_etag("box", box_id, version, presign_window(PHOTO_URL_EXPIRES))
+    cached = not_modified(etag)
+    if cached:
+        return cached
+
     row = get_box(box_id)
     if not row:
         abort(404)
@@ -209,7 +299,26 @@ def box_detail(box_id: int):
     _ensure_photo_url_on_box(box)
     items = get_items(box_id)
 
-    return render_template("box_detail.html", box=box, items=items, photo_url=box["photo_url"])
+    html = render_template("box_detail.html", box=box, items=items, photo_url=box["photo_url"])
+    return with_etag(html, etag)
+
+
+@bp.get("/box/<int:box_id>/status")
+def box_status(box_id: int):
+    """Polled by the detail page while a box is still being analyzed."""
+    row = get_box(box_id)
+    if not row:
+        abort(404)
+    box = dict(row)
+    items = get_items(box_id)
+    return jsonify(
+        box_id=box_id,
+        name=box.get("name"),
+        status=box.get("status") or "ready",
+        item_count=len(items),
+        enriched_count=sum(1 for it in items if it["image_url"]),
+        jobs=[dict(j) for j in get_box_jobs(box_id)],
+    )
 
 
 @bp.route("/box/<int:box_id>/delete", methods=["POST"])
@@ -0,0 +1,35 @@
+# routes/export.py
+from datetime import datetime
+
+from flask import Blueprint, Response, abort, request, stream_with_context
+
+from services.export import FORMATS, export_inventory, gzip_chunks
+
+bp = Blueprint("export", __name__, url_prefix="/export")
+
+@bp.get("/")
+def export():
+    """
+    Whole inventory as a streamed download: ?format=csv|jsonl|columns.
+    ?after=<item_id> resumes after the last row received; gzip when accepted.
+    """
+    fmt = request.args.get("format", "csv")
+    try:
+        after_id = max(0, int(request.args.get("after", 0)))
+    except ValueError:
+        abort(400)
+    if fmt not in FORMATS:
+        abort(400)
+    mimetype, ext = FORMATS[fmt]
+
+    body = export_inventory(fmt, after_id=after_id)
+    headers = {
+        "Content-Disposition": f'attachment; filename="inventory-{datetime.utcnow():%Y%m%d}.{ext}"',
+        "Cache-Control": "no-store",
+        "Vary": "Accept-Encoding",
+    }
+    if "gzip" in request.accept_encodings:
+        body = gzip_chunks(body)
+        headers["Content-Encoding"] = "gzip"
+    # stream_with_context keeps the request's DB connection open while the rows are read
+    return Response(stream_with_context(body), mimetype=mimetype, headers=headers)
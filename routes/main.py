@@ -1,6 +1,40 @@
-from flask import Blueprint, render_template
+from flask import Blueprint, Response, jsonify, render_template
+
+from db.connection import get_db
+from services.cache import cache_stats
+from services.http_cache import fragment_cache_stats
+from services.metrics import render_prometheus
+from services.outbound import client
+from services.vision import vision_stats
+from storage_s3 import check_identity, presign_cache_stats
+
 main_bp = Blueprint('main', __name__)
 
 @main_bp.route('/about')
 def about():
-    return render_template('about.html')
\ No newline at end of file
+    return render_template('about.html')
+
+@main_bp.route('/ops/stats')
+def ops_stats():
+    # per-host latency/error counters, breaker states and cache hit rates
+    return jsonify(http=client.stats(), lookup_cache=cache_stats(), presign_cache=presign_cache_stats(),
+                   fragment_cache=fragment_cache_stats(), vision=dict(vision_stats))
+
+@main_bp.route('/metrics')
+def metrics():
+    # per-process: with several gunicorn workers each scrape sees one of them
+    return Response(render_prometheus(), mimetype="text/plain; version=0.0.4")
+
+@main_bp.route('/healthz')
+def healthz():
+    """Readiness probe: the DB answers and the AWS identity check (cached) passed."""
+    try:
+        con = get_db()
+        con.execute("SELECT 1").fetchone()
+        con.close()
+        db_ok = True
+    except Exception:
+        db_ok = False
+    aws = check_identity(wait=False)  # a stale result is refreshed off the probe's thread
+    ready = db_ok and bool(aws["ok"])
+    return jsonify(status="ok" if ready else "unavailable", db=db_ok, aws=aws), (200 if ready else 503)
@@ -1,20 +1,48 @@
 # routes/search.py
-from flask import Blueprint, render_template, request
-from db.queries import search_items
+import os
+
+from flask import Blueprint, abort, jsonify, render_template, request
+from db.queries import get_inventory_version, search_items
+from services.http_cache import not_modified, page_etag, with_etag
 
 bp = Blueprint("search", __name__, url_prefix="/search")
 
+SEARCH_PAGE_SIZE = int(os.getenv("SEARCH_PAGE_SIZE", "48"))
+SEARCH_API_MAX_LIMIT = 200
+
+def _result_json(r) -> dict:
+    d = dict(r)
+    d.pop("score", None)  # internal sort key; the cursor already carries it
+    return d
+
 @bp.route("/", methods=["GET", "POST"])
 def search():
     q = (request.values.get("q") or "").strip()
-    results = search_items(q)
+    etag = page_etag("search", get_inventory_version(), q) if request.method == "GET" else None
+    cached = not_modified(etag)
+    if cached:
+        return cached
+    results, next_cursor = search_items(q, limit=SEARCH_PAGE_SIZE)
 
-    # JSON-safe copy
-    results_json = [dict(r) for r in (results or [])]
+    # JSON-safe copy (first page only; the page pulls more from /search/api)
+    results_json = [_result_json(r) for r in (results or [])]
 
-    return render_template(
+    html = render_template(
         "search.html",
         q=q,
         results=results,          # SSR fallback
-        results_json=results_json # for JS bootstrap
+        results_json=results_json, # for JS bootstrap
+        next_cursor=next_cursor,
     )
+    return with_etag(html, etag)
+
+@bp.get("/api")
+def search_api():
+    """JSON page of results for infinite scroll: ?q=&cursor=&limit="""
+    q = (request.args.get("q") or "").strip()
+    try:
+        limit = max(1, min(SEARCH_API_MAX_LIMIT, int(request.args.get("limit", SEARCH_PAGE_SIZE))))
+        results, next_cursor = search_items(q, limit=limit, cursor=request.args.get("cursor") or None)
+    except ValueError:
+        abort(400)
+    return jsonify(q=q, results=[_result_json(r) for r in results], next_cursor=next_cursor)
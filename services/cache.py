@@ -0,0 +1,156 @@
+import functools, json, os, threading, time
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Optional, Tuple
+
+from db.connection import get_db
+from services.normalize import canonical_name
+
+IMAGE_TTL_S = float(os.getenv("LOOKUP_CACHE_IMAGE_TTL_S", str(30 * 24 * 3600)))
+PRICE_TTL_S = float(os.getenv("LOOKUP_CACHE_PRICE_TTL_S", str(24 * 3600)))
+NEGATIVE_TTL_S = float(os.getenv("LOOKUP_CACHE_NEGATIVE_TTL_S", str(3600)))
+LRU_SIZE = int(os.getenv("LOOKUP_CACHE_LRU_SIZE", "4096"))
+PURGE_INTERVAL_S = float(os.getenv("LOOKUP_CACHE_PURGE_INTERVAL_S", "3600"))
+
+_MISSING = object()
+
+
+def normalize_key(name: str) -> str:
+    """'  Extension-Cords ', 'extension cord' and 'power cord' share one cache entry."""
+    return canonical_name(name)
+
+
+class LookupCache:
+    """
+    Two-level cache for external lookups: an in-process LRU in front of the
+    lookup_cache SQLite table, so entries survive restarts and are shared by
+    every gunicorn worker. Values are JSON; None is cached as a miss.
+    """
+
+    def __init__(self, lru_size: int = LRU_SIZE):
+        self._lru: "OrderedDict[Tuple[str, str], Tuple[Any, float]]" = OrderedDict()
+        self._lru_size = lru_size
+        self._lock = threading.Lock()
+        self.stats: Dict[str, int] = {"memory_hits": 0, "db_hits": 0, "misses": 0, "stores": 0, "errors": 0}
+
+    def _bump(self, counter: str) -> None:
+        with self._lock:
+            self.stats[counter] += 1
+
+    def _remember(self, k: Tuple[str, str], value: Any, expires_at: float) -> None:
+        with self._lock:
+            self._lru[k] = (value, expires_at)
+            self._lru.move_to_end(k)
+            while len(self._lru) > self._lru_size:
+                self._lru.popitem(last=False)
+
+    def get(self, kind: str, key: str) -> Any:
+        """Returns the cached value (possibly None for a cached miss) or _MISSING."""
+        k = (kind, key)
+        now = time.time()
+        with self._lock:
+            hit = self._lru.get(k)
+            if hit is not None:
+                if hit[1] > now:
+                    self._lru.move_to_end(k)
+                    self.stats["memory_hits"] += 1
+                    return hit[0]
+                del self._lru[k]
+        try:
+            con = get_db()
+            row = con.execute(
+                "SELECT value, expires_at FROM lookup_cache WHERE kind=? AND key=?", (kind, key)
+            ).fetchone()
+            con.close()
+        except Exception:
+            self._bump("errors")
+            row = None
+        if row and row["expires_at"] > now:
+            value = json.loads(row["value"])
+            self._remember(k, value, row["expires_at"])
+            self._bump("db_hits")
+            return value
+        self._bump("misses")
+        return _MISSING
+
+    def set(self, kind: str, key: str, value: Any, ttl_s: float) -> None:
+        expires_at = time.time() + ttl_s
+        self._remember((kind, key), value, expires_at)
+        try:
+            con = get_db()
+            con.execute(
+                "INSERT OR REPLACE INTO lookup_cache (kind, key, value, expires_at) VALUES (?,?,?,?)",
+                (kind, key, json.dumps(value), expires_at),
+            )
+            con.commit()
+            con.close()
+        except Exception:
+            self._bump("errors")
+            return
+        self._bump("stores")
+
+    def clear_memory(self) -> None:
+        with self._lock:
+            self._lru.clear()
+
+    def purge_expired(self) -> int:
+        """Delete expired rows (including keys no longer produced by normalize_key once they lapse)."""
+        con = get_db()
+        cur = con.execute("DELETE FROM lookup_cache WHERE expires_at <= ?", (time.time(),))
+        con.commit()
+        con.close()
+        return cur.rowcount
+
+
+lookup_cache = LookupCache()
+
+
+def cache_stats() -> Dict[str, int]:
+    with lookup_cache._lock:
+        return dict(lookup_cache.stats, lru_entries=len(lookup_cache._lru))
+
+
+def cached_lookup(kind: str, ttl_s: float, is_miss: Optional[Callable[[Any], bool]] = None):
+    """
+    Decorator for fn(name, *args). The first argument is normalized into the
+    cache key (remaining args are appended). Results for which is_miss(result)
+    is true -- None by default -- are kept for NEGATIVE_TTL_S only. The
+    wrapper's peek()/store() read and fill the same entries without calling fn.
+    """
+    is_miss = is_miss or (lambda v: v is None)
+
+    def _key(name, args, kwargs) -> str:
+        base = normalize_key(name)
+        if not base:
+            return ""
+        return "|".join([base, *(str(a) for a in args), *(f"{k}={v}" for k, v in sorted(kwargs.items()))])
+
+    def deco(fn):
+        @functools.wraps(fn)
+        def wrapper(name, *args, **kwargs):
+            key = _key(name, args, kwargs)
+            if not key:
+                return fn(name, *args, **kwargs)
+            value = lookup_cache.get(kind, key)
+            if value is not _MISSING:
+                return value
+            value = fn(name, *args, **kwargs)
+            lookup_cache.set(kind, key, value, NEGATIVE_TTL_S if is_miss(value) else ttl_s)
+            return value
+
+        def peek(name, *args, **kwargs) -> Tuple[bool, Any]:
+            """(True, value) on a cache hit, (False, None) when fn would have to run."""
+            key = _key(name, args, kwargs)
+            value = lookup_cache.get(kind, key) if key else _MISSING
+            return (False, None) if value is _MISSING else (True, value)
+
+        def store(value, name, *args, **kwargs) -> None:
+            """Cache a value computed elsewhere (e.g. a batched async lookup) under fn's key."""
+            key = _key(name, args, kwargs)
+            if key:
+                lookup_cache.set(kind, key, value, NEGATIVE_TTL_S if is_miss(value) else ttl_s)
+
+        wrapper.uncached = fn
+        wrapper.peek = peek
+        wrapper.store = store
+        return wrapper
+    return deco
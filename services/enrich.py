@@ -0,0 +1,119 @@
+import asyncio, os
+from concurrent.futures import ThreadPoolExecutor, wait
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from services.images import best_image_for_name, image_for_name_async
+from services.metrics import timed
+from services.normalize import get_matcher
+from services.outbound import async_enabled, run_async
+from services.pricing import local_price_cents, price_for_name_async
+
+ENRICH_WORKERS = int(os.getenv("ENRICH_WORKERS", "8"))
+ENRICH_DEADLINE_S = float(os.getenv("ENRICH_DEADLINE_S", "45"))
+
+# shared by every request in this worker process; bounded so a big photo
+# can't open dozens of sockets at once
+_pool = ThreadPoolExecutor(max_workers=ENRICH_WORKERS, thread_name_prefix="enrich")
+
+
+def clamp_confidence(conf) -> float:
+    try:
+        c = float(conf or 0.0)
+    except Exception:
+        c = 0.0
+    return max(0.0, min(1.0, c))
+
+
+@timed("enrich")
+def enrich_items(items: Iterable[dict], deadline_s: Optional[float] = None
+                 ) -> List[Tuple[str, float, Optional[str], Optional[int]]]:
+    """
+    Look up image + price for every item concurrently.
+    items = [{"name": ..., "confidence": ...}, ...]
+    Returns [(name, confidence, image_url, price_cents), ...] in input order.
+    Lookups still running when the deadline passes come back as None
+    (partial results) instead of holding the request.
+    """
+    rows: List[Tuple[str, float]] = []
+    for it in items:
+        name = (it.get("name") or "").strip()
+        if name:
+            rows.append((name, clamp_confidence(it.get("confidence"))))
+    if not rows:
+        return []
+
+    # one lookup per canonical name, even if the model repeats itself
+    matcher = get_matcher()
+    keys = [matcher.canonical(name) for name, _ in rows]
+    names: Dict[str, str] = {}
+    for (name, _), key in zip(rows, keys):
+        names.setdefault(key, name)
+
+    timeout = max(0.0, ENRICH_DEADLINE_S if deadline_s is None else deadline_s)
+    lookup = _lookup_async if async_enabled() else _lookup_threaded
+    resolved = lookup(names, timeout)
+    return [(name, conf, *resolved[key]) for (name, conf), key in zip(rows, keys)]
+
+
+def _lookup_threaded(names: Dict[str, str], timeout: float) -> Dict[str, tuple]:
+    """Fallback without aiohttp: every lookup on the enrich thread pool."""
+    futures: Dict[str, tuple] = {
+        key: (_pool.submit(best_image_for_name, name), _pool.submit(local_price_cents, name))
+        for key, name in names.items()
+    }
+    wait([f for pair in futures.values() for f in pair], timeout=timeout)
+
+    def _result(f):
+        if not f.done():
+            f.cancel()  # drops it if still queued; a running call just finishes in the background
+            return None
+        try:
+            return f.result()
+        except Exception:
+            return None
+
+    return {key: (_result(img_f), _result(price_f)) for key, (img_f, price_f) in futures.items()}
+
+
+def _lookup_async(names: Dict[str, str], timeout: float) -> Dict[str, tuple]:
+    """
+    Cache hits are answered here; every miss (images and prices for all
+    names) runs as one batch on the provider event loop, so the batch costs
+    about one provider round trip rather than one per worker slot.
+    """
+    resolved: Dict[str, list] = {}
+    images: Dict[str, str] = {}
+    prices: Dict[str, str] = {}
+    for key, name in names.items():
+        img_hit, img = best_image_for_name.peek(name)
+        price_hit, price = local_price_cents.peek(name)
+        resolved[key] = [img, price]
+        if not img_hit:
+            images[key] = name
+        if not price_hit:
+            prices[key] = name
+
+    if images or prices:
+        found = run_async(_lookup_all(images, prices, timeout), timeout=timeout + 5)
+        for key, img in found["image"].items():
+            resolved[key][0] = img
+            best_image_for_name.store(img, names[key])
+        for key, price in found["price"].items():
+            resolved[key][1] = price
+            local_price_cents.store(price, names[key])
+    return {key: tuple(v) for key, v in resolved.items()}
+
+
+async def _lookup_all(images: Dict[str, str], prices: Dict[str, str], timeout: float) -> Dict[str, dict]:
+    """Runs on the provider loop; lookups unfinished at the deadline are cancelled and left out."""
+    tasks = {("image", key): asyncio.ensure_future(image_for_name_async(name)) for key, name in images.items()}
+    tasks.update({("price", key): asyncio.ensure_future(price_for_name_async(name))
+                  for key, name in prices.items()})
+    done, pending = await asyncio.wait(tasks.values(), timeout=timeout)
+    for t in pending:
+        t.cancel()
+    found: Dict[str, dict] = {"image": {}, "price": {}}
+    for (kind, key), t in tasks.items():
+        if t in done and t.exception() is None:
+            found[kind][key] = t.result()
+    return found
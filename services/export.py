@@ -0,0 +1,76 @@
+"""
+Whole-inventory export, streamed chunk by chunk from db.queries.iter_inventory
+so memory stays flat however many items there are.
+
+Formats:
+  csv      header + one row per item
+  jsonl    one JSON object per item
+  columns  one JSON line per chunk holding a list per column, so keys
+           aren't repeated per row (about half the size of jsonl)
+
+Every row carries item_id; passing the last one seen as after_id resumes
+an interrupted export.
+"""
+import csv, io, json, os, zlib
+from typing import Iterable, Iterator
+
+from db.queries import EXPORT_COLUMNS, iter_inventory
+
+EXPORT_CHUNK_ROWS = int(os.getenv("EXPORT_CHUNK_ROWS", "1000"))
+EXPORT_GZIP_LEVEL = int(os.getenv("EXPORT_GZIP_LEVEL", "6"))
+
+FORMATS = {
+    "csv": ("text/csv", "csv"),
+    "jsonl": ("application/x-ndjson", "jsonl"),
+    "columns": ("application/x-ndjson", "columns.jsonl"),
+}
+
+
+def _csv_chunks(chunks, header: bool) -> Iterator[str]:
+    buf = io.StringIO()
+    out = csv.writer(buf)
+    if header:
+        out.writerow(EXPORT_COLUMNS)
+    for rows in chunks:
+        out.writerows(tuple(r) for r in rows)
+        yield buf.getvalue()
+        buf.seek(0)
+        buf.truncate()
+    if buf.tell():
+        yield buf.getvalue()
+
+
+def _jsonl_chunks(chunks) -> Iterator[str]:
+    for rows in chunks:
+        yield "".join(json.dumps(dict(r), separators=(",", ":")) + "\n" for r in rows)
+
+
+def _column_chunks(chunks) -> Iterator[str]:
+    for rows in chunks:
+        cols = {c: [r[c] for r in rows] for c in EXPORT_COLUMNS}
+        line = {"rows": len(rows), "last_item_id": rows[-1]["item_id"], "columns": cols}
+        yield json.dumps(line, separators=(",", ":")) + "\n"
+
+
+def export_inventory(fmt: str = "csv", after_id: int = 0) -> Iterator[bytes]:
+    """Encoded chunks of the export. A resumed CSV (after_id set) has no header, so it can be appended."""
+    if fmt not in FORMATS:
+        raise ValueError(f"unknown export format: {fmt}")
+    chunks = iter_inventory(after_id=after_id, chunk_size=EXPORT_CHUNK_ROWS)
+    if fmt == "csv":
+        text = _csv_chunks(chunks, header=not after_id)
+    elif fmt == "jsonl":
+        text = _jsonl_chunks(chunks)
+    else:
+        text = _column_chunks(chunks)
+    return (piece.encode("utf-8") for piece in text)
+
+
+def gzip_chunks(chunks: Iterable[bytes], level: int = EXPORT_GZIP_LEVEL) -> Iterator[bytes]:
+    """Stream a gzip member over chunks without buffering the whole body."""
+    z = zlib.compressobj(level, zlib.DEFLATED, 31)  # wbits 31 = gzip header + trailer
+    for chunk in chunks:
+        out = z.compress(chunk)
+        if out:
+            yield out
+    yield z.flush()
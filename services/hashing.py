@@ -0,0 +1,55 @@
+import hashlib
+from io import BytesIO
+from typing import Optional, Union
+
+try:
+    from PIL import Image, ImageOps
+except Exception:
+    Image = None
+
+
+def sha256_hex(data: bytes) -> str:
+    return hashlib.sha256(data).hexdigest()
+
+
+def sha256_file(path: str, chunk_size: int = 1024 * 1024) -> str:
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(chunk_size), b""):
+            h.update(chunk)
+    return h.hexdigest()
+
+
+def content_key(sha256: str, ext: str, prefix: str = "uploads") -> str:
+    """Content-addressed S3 key: identical bytes always land on the same object."""
+    ext = (ext or "").lower()
+    if ext and not ext.startswith("."):
+        ext = "." + ext
+    if ext == ".jpeg":
+        ext = ".jpg"
+    return f"{prefix}/{sha256[:2]}/{sha256}{ext}"
+
+
+def dhash_hex(image: Union[bytes, str], size: int = 8) -> Optional[str]:
+    """
+    64-bit difference hash (16 hex chars) that survives re-encoding and
+    resizing; photos a few bits apart are near-duplicates. `image` is bytes
+    or a path. None when Pillow is missing or the image doesn't decode.
+    """
+    if Image is None:
+        return None
+    try:
+        with Image.open(BytesIO(image) if isinstance(image, bytes) else image) as im:
+            im.draft("L", (size * 16, size * 16))  # cheap JPEG downscale while decoding
+            im = ImageOps.exif_transpose(im).convert("L").resize((size + 1, size), Image.BILINEAR)
+            px = list(im.getdata())
+    except Exception:
+        return None
+    bits = 0
+    for row in range(size):
+        for col in range(size):
+            left = px[row * (size + 1) + col]
+            right = px[row * (size + 1) + col + 1]
+            bits = (bits << 1) | (left > right)
+    return f"{bits:0{size * size // 4}x}"
+
@@ -0,0 +1,93 @@
+"""
+Conditional GET for the HTML pages and a small cache of rendered fragments.
+
+Pages build a strong ETag from the change counters the DB keeps
+(inventory_version, boxes.version) plus whatever else shows up in the HTML
+(query args, the presign window). A matching If-None-Match is answered with
+304 before any other query, presign or template render runs.
+"""
+import hashlib, os, threading
+from collections import OrderedDict
+from pathlib import Path
+from typing import Hashable, Optional
+
+from flask import make_response, render_template, request, session
+from markupsafe import Markup
+
+FRAGMENT_CACHE_SIZE = int(os.getenv("FRAGMENT_CACHE_SIZE", "2000"))
+
+
+def _templates_stamp() -> str:
+    # the same on every worker of a deploy, different once a template changes
+    root = Path(__file__).resolve().parent.parent / "templates"
+    h = hashlib.sha1()
+    for p in sorted(root.rglob("*.html")):
+        st = p.stat()
+        h.update(f"{p.relative_to(root)}:{st.st_size}:{int(st.st_mtime)}".encode())
+    return h.hexdigest()[:12]
+
+
+ETAG_SALT = os.getenv("ETAG_SALT") or _templates_stamp()
+
+
+def page_etag(*parts) -> Optional[str]:
+    """
+    Strong ETag over parts, or None when the response must not be reused:
+    a pending flash message is rendered into this page only.
+    """
+    if session.get("_flashes"):
+        return None
+    raw = "|".join(str(p) for p in (ETAG_SALT, *parts))
+    return hashlib.sha1(raw.encode()).hexdigest()[:24]
+
+
+def _tag(response, etag: str):
+    response.set_etag(etag)
+    # always revalidate; the 304 is the cheap path
+    response.headers["Cache-Control"] = "no-cache"
+    return response
+
+
+def not_modified(etag: Optional[str]):
+    """A 304 response if the client already has this version, else None."""
+    if etag and request.method in ("GET", "HEAD") and request.if_none_match.contains(etag):
+        return _tag(make_response("", 304), etag)
+    return None
+
+
+def with_etag(body, etag: Optional[str]):
+    response = make_response(body)
+    return _tag(response, etag) if etag else response
+
+
+# ---------- rendered fragments ----------
+
+_fragments: "OrderedDict[tuple, Markup]" = OrderedDict()
+_fragments_lock = threading.Lock()
+fragment_stats = {"hits": 0, "misses": 0}
+
+
+def render_fragment(template: str, key: Hashable, **context) -> Markup:
+    """
+    render_template for a page fragment, cached under (template, key). The key
+    must cover everything the fragment shows (e.g. box id + version + photo URL).
+    """
+    ck = (template, key)
+    with _fragments_lock:
+        html = _fragments.get(ck)
+        if html is not None:
+            _fragments.move_to_end(ck)
+            fragment_stats["hits"] += 1
+            return html
+        fragment_stats["misses"] += 1
+    html = Markup(render_template(template, **context))
+    with _fragments_lock:
+        _fragments[ck] = html
+        while len(_fragments) > FRAGMENT_CACHE_SIZE:
+            _fragments.popitem(last=False)
+    return html
+
+
+def fragment_cache_stats() -> dict:
+    with _fragments_lock:
+        return dict(fragment_stats, entries=len(_fragments))
@@ -1,71 +1,145 @@
-import requests
 from urllib.parse import quote_plus
 from typing import Optional
 import os
 
+from services.cache import IMAGE_TTL_S, cached_lookup
+from services.metrics import timed
+from services.outbound import async_client, async_enabled, client, first_in_priority, run_async
+
 SERPAPI_KEY = os.getenv("SERPAPI_KEY")
 OPENVERSE_ENDPOINT = "https://api.openverse.engineering/v1/images/"
+WIKIPEDIA_ENDPOINT = "https://en.wikipedia.org/w/api.php"
+
+# ---------- provider requests + response parsing (shared by sync and async) ----------
+
+def _serpapi_params(query: str) -> dict:
+    return {"engine": "google_images", "q": query, "ijn": "0", "api_key": SERPAPI_KEY, "safe": "active"}
+
+def _serpapi_pick(body: dict) -> Optional[str]:
+    for it in (body.get("images_results") or []):
+        url = (it.get("original") or it.get("thumbnail") or "").strip()
+        if url.startswith("http"):
+            return url
+    return None
+
+def _openverse_params(query: str) -> dict:
+    return {"q": query, "page_size": 10, "license": "cc0,cc-by,cc-by-sa", "mature": "false"}
+
+def _openverse_pick(body: dict) -> Optional[str]:
+    for item in body.get("results", []):
+        url = (item.get("url") or "").strip()
+        thumb = (item.get("thumbnail") or "").strip()
+        if any(url.lower().endswith(ext) for ext in (".jpg",".jpeg",".png",".webp")):
+            return url
+        if thumb:
+            return thumb
+    return None
+
+def _wikipedia_params(query: str) -> dict:
+    return {
+        "action": "query", "format": "json", "prop": "pageimages",
+        "piprop": "original|thumbnail", "pithumbsize": 800, "titles": query, "redirects": 1
+    }
+
+def _wikipedia_pick(body: dict) -> Optional[str]:
+    pages = (body.get("query", {}).get("pages", {}) or {})
+    for _, page in pages.items():
+        img = page.get("original", {}).get("source") or page.get("thumbnail", {}).get("source")
+        if img:
+            return img
+    return None
 
 def _serpapi_image(query: str) -> Optional[str]:
     if not SERPAPI_KEY or not query.strip():
         return None
     try:
-        r = requests.get(
-            "https://serpapi.com/search.json",
-            params={"engine": "google_images", "q": query, "ijn": "0",
-                    "api_key": SERPAPI_KEY, "safe": "active"},
-            timeout=8,
-        )
+        r = client.get("serpapi", "https://serpapi.com/search.json", params=_serpapi_params(query), timeout=8)
         if r.ok:
-            for it in (r.json().get("images_results") or []):
-                url = (it.get("original") or it.get("thumbnail") or "").strip()
-                if url.startswith("http"):
-                    return url
+            return _serpapi_pick(r.json())
     except Exception:
         pass
     return None
 
 def _openverse_image(query: str) -> Optional[str]:
     try:
-        r = requests.get(
-            OPENVERSE_ENDPOINT,
-            params={"q": query, "page_size": 10, "license": "cc0,cc-by,cc-by-sa", "mature": "false"},
-            timeout=6,
-        )
+        r = client.get("openverse", OPENVERSE_ENDPOINT, params=_openverse_params(query), timeout=6)
         if r.ok:
-            for item in r.json().get("results", []):
-                url = (item.get("url") or "").strip()
-                thumb = (item.get("thumbnail") or "").strip()
-                if any(url.lower().endswith(ext) for ext in (".jpg",".jpeg",".png",".webp")):
-                    return url
-                if thumb:
-                    return thumb
+            return _openverse_pick(r.json())
     except Exception:
         pass
     return None
 
 def _wikipedia_image(query: str) -> Optional[str]:
     try:
-        r = requests.get("https://en.wikipedia.org/w/api.php", params={
-            "action": "query", "format": "json", "prop": "pageimages",
-            "piprop": "original|thumbnail", "pithumbsize": 800, "titles": query, "redirects": 1
-        }, timeout=6)
+        r = client.get("wikipedia", WIKIPEDIA_ENDPOINT, params=_wikipedia_params(query), timeout=6)
+        if r.ok:
+            return _wikipedia_pick(r.json())
+    except Exception:
+        pass
+    return None
+
+# ---------- async (one event loop, all providers at once) ----------
+
+async def _serpapi_image_async(query: str) -> Optional[str]:
+    if not SERPAPI_KEY or not query.strip():
+        return None
+    try:
+        r = await async_client().get("serpapi", "https://serpapi.com/search.json",
+                                     params=_serpapi_params(query), timeout=8)
         if r.ok:
-            pages = (r.json().get("query", {}).get("pages", {}) or {})
-            for _, page in pages.items():
-                img = page.get("original", {}).get("source") or page.get("thumbnail", {}).get("source")
-                if img:
-                    return img
+            return _serpapi_pick(r.json())
     except Exception:
         pass
     return None
 
+async def _openverse_image_async(query: str) -> Optional[str]:
+    try:
+        r = await async_client().get("openverse", OPENVERSE_ENDPOINT, params=_openverse_params(query), timeout=6)
+        if r.ok:
+            return _openverse_pick(r.json())
+    except Exception:
+        pass
+    return None
+
+async def _wikipedia_image_async(query: str) -> Optional[str]:
+    try:
+        r = await async_client().get("wikipedia", WIKIPEDIA_ENDPOINT, params=_wikipedia_params(query), timeout=6)
+        if r.ok:
+            return _wikipedia_pick(r.json())
+    except Exception:
+        pass
+    return None
+
+async def image_for_name_async(name: str) -> str:
+    """
+    Uncached best_image_for_name for the provider loop: SerpAPI, Openverse and
+    Wikipedia are asked at once and the first hit in that priority order wins.
+    """
+    q = (name or "").strip()
+    if not q:
+        return "https://picsum.photos/seed/placeholder/600/400"
+    url = await first_in_priority([_serpapi_image_async(q), _openverse_image_async(q), _wikipedia_image_async(q)])
+    return url or _fallback_image(q)
+
+# ---------- sync facade ----------
+
+def _fallback_image(q: str) -> str:
+    return f"https://source.unsplash.com/600x400/?{quote_plus(q)}"
+
+def _is_fallback_image(url: str) -> bool:
+    # no provider had a hit; worth asking again sooner than a real match
+    return not url or url.startswith("https://source.unsplash.com/")
+
+@timed("image_lookup")
+@cached_lookup("image", IMAGE_TTL_S, is_miss=_is_fallback_image)
 def best_image_for_name(name: str) -> str:
     q = (name or "").strip()
     if not q:
         return "https://picsum.photos/seed/placeholder/600/400"
+    if async_enabled():
+        return run_async(image_for_name_async(q))
     for fn in (_serpapi_image, _openverse_image, _wikipedia_image):
         url = fn(q)
         if url:
             return url
-    return f"https://source.unsplash.com/600x400/?{quote_plus(q)}"
+    return _fallback_image(q)
@@ -0,0 +1,124 @@
+import logging, os, threading, time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from pathlib import Path
+from typing import Callable, Dict, List, Optional
+
+from db.queries import find_photo_by_sha256
+from services import thumbnails
+from services.hashing import content_key, dhash_hex, sha256_file
+from services.jobs import ENRICH, insert_boxes_with_jobs, put_photo
+from services.normalize import merge_duplicates
+from services.vision import detect_items_json
+
+log = logging.getLogger(__name__)
+
+IMPORT_WORKERS = int(os.getenv("IMPORT_WORKERS", "4"))
+IMPORT_BATCH_SIZE = int(os.getenv("IMPORT_BATCH_SIZE", "25"))
+
+CONTENT_TYPES = {".jpg": "image/jpeg", ".jpeg": "image/jpeg", ".png": "image/png", ".webp": "image/webp"}
+
+
+def find_photos(root: Path) -> List[Path]:
+    return sorted(p for p in Path(root).rglob("*") if p.is_file() and p.suffix.lower() in CONTENT_TYPES)
+
+
+class _Importer:
+    """One import run: workers analyze photos, the caller's thread writes batches."""
+
+    def __init__(self):
+        self.seen: set = set()
+        self.lock = threading.Lock()
+
+    def analyze(self, path: Path) -> Optional[dict]:
+        """Box row for one photo, or None if its bytes were imported already."""
+        # the file is hashed, uploaded and decoded straight from disk
+        ext = path.suffix.lower()
+        sha256 = sha256_file(path)
+        with self.lock:
+            if sha256 in self.seen:
+                return None
+            self.seen.add(sha256)
+        if find_photo_by_sha256(sha256):
+            return None  # an earlier (possibly interrupted) run got this one
+
+        content_type = CONTENT_TYPES[ext]
+        key, variants = put_photo(str(path), content_key(sha256, ext), content_type, sha256)
+        if variants is None and thumbnails.enabled():
+            try:
+                variants = thumbnails.generate_and_upload(key, str(path))
+            except Exception:
+                log.exception("thumbnails for %s failed; pages will backfill them", path)
+        result = detect_items_json(str(path), content_type, sha256=sha256)
+        # "Steel Pot" / "steel pots" / "stainless pot" -> one row, highest confidence wins
+        merged = merge_duplicates((it["name"], it["confidence"]) for it in result.get("items", []))
+        items = [(name, conf, None, None) for name, conf in merged]
+        return {
+            "name": result.get("box_name") or "Unlabeled Box",
+            "notes": result.get("notes", ""),
+            "status": "enriching" if items else "ready",
+            "photo": key,
+            "photo_sha256": sha256,
+            "photo_phash": dhash_hex(str(path)),
+            "photo_variants": variants,
+            "items": items,
+            "job_kind": ENRICH if items else None,
+        }
+
+
+def import_directory(root: Path, workers: int = IMPORT_WORKERS, batch_size: int = IMPORT_BATCH_SIZE,
+                     progress: Callable[[str], None] = print) -> Dict[str, float]:
+    """
+    Create a box per photo under `root`. At most `workers` photos are read and
+    analyzed at once, each streamed from disk; finished boxes (with their items and enrichment job) are
+    committed `batch_size` at a time. Photos whose bytes already belong to a
+    box are skipped, so an interrupted import can simply be run again.
+    """
+    paths = find_photos(root)
+    stats: Dict[str, float] = {"found": len(paths), "imported": 0, "skipped": 0, "failed": 0}
+    importer = _Importer()
+    pending: List[dict] = []
+    started = time.monotonic()
+
+    def rate() -> float:
+        return stats["imported"] * 60.0 / max(1e-9, time.monotonic() - started)
+
+    def flush() -> None:
+        if pending:
+            insert_boxes_with_jobs(pending)
+            stats["imported"] += len(pending)
+            pending.clear()
+        done = stats["imported"] + stats["skipped"] + stats["failed"]
+        progress(f"[{done}/{stats['found']}] imported {stats['imported']}, skipped {stats['skipped']}, "
+                 f"failed {stats['failed']} ({rate():.1f} boxes/min)")
+
+    todo = iter(paths)
+    with ThreadPoolExecutor(max_workers=max(1, workers), thread_name_prefix="import") as pool:
+        in_flight = {}
+        while True:
+            # keep the pool busy without holding every photo in memory at once
+            while len(in_flight) < max(1, workers) * 2:
+                path = next(todo, None)
+                if path is None:
+                    break
+                in_flight[pool.submit(importer.analyze, path)] = path
+            if not in_flight:
+                break
+            finished, _ = wait(in_flight, return_when=FIRST_COMPLETED)
+            for f in finished:
+                path = in_flight.pop(f)
+                try:
+                    row = f.result()
+                except Exception as e:
+                    stats["failed"] += 1
+                    progress(f"failed {path}: {type(e).__name__}: {e}")
+                    continue
+                if row is None:
+                    stats["skipped"] += 1
+                else:
+                    pending.append(row)
+            if len(pending) >= batch_size:
+                flush()
+    flush()
+    stats["elapsed_s"] = round(time.monotonic() - started, 2)
+    stats["boxes_per_min"] = round(rate(), 1)
+    return stats
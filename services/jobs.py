@@ -0,0 +1,299 @@
+import hashlib, json, logging, os, tempfile, threading, time
+from pathlib import Path
+from typing import BinaryIO, Callable, Dict, List, Optional, Tuple
+
+from db.queries import (
+    claim_job,
+    claim_photo_variants,
+    enqueue_job,
+    find_photo_by_sha256,
+    finish_job,
+    get_box,
+    get_unenriched_items,
+    insert_boxes_batch,
+    replace_items,
+    set_box_status,
+    set_photo_variants,
+    update_box_analysis,
+    update_box_photo,
+    update_items_enrichment,
+)
+from services import thumbnails
+from services.cache import PURGE_INTERVAL_S, lookup_cache
+from services.enrich import enrich_items
+from services.hashing import dhash_hex, sha256_file
+from services.metrics import timed
+from services.normalize import merge_duplicates
+from services.vision import detect_items_json
+from storage_s3 import download_bytes, object_exists, upload_fileobj
+
+log = logging.getLogger(__name__)
+
+JOB_WORKERS = int(os.getenv("JOB_WORKERS", "2"))
+JOB_POLL_S = float(os.getenv("JOB_POLL_S", "1.0"))
+JOB_MAX_ATTEMPTS = int(os.getenv("JOB_MAX_ATTEMPTS", "3"))
+JOB_RETRY_BASE_S = float(os.getenv("JOB_RETRY_BASE_S", "5"))
+JOB_STALE_S = float(os.getenv("JOB_STALE_S", "600"))  # running longer than this => worker died
+SPOOL_CHUNK = 1024 * 1024
+SPOOL_DIR = Path(os.getenv("JOB_SPOOL_DIR") or Path(tempfile.gettempdir()) / "inventoryiq-spool")
+
+_wake = threading.Event()
+_start_lock = threading.Lock()
+_threads: list = []
+_purge_lock = threading.Lock()
+_next_purge = 0.0
+
+
+# ---------- handlers ----------
+
+def _analyze(box_id: int, payload: dict) -> None:
+    """Upload the spooled photo, run vision, store bare items, then queue enrichment."""
+    box = get_box(box_id)
+    if not box:
+        return  # box deleted while queued
+    path = payload["path"]
+    key = payload["key"]
+    content_type = payload.get("content_type") or "image/jpeg"
+    sha256 = payload.get("sha256") or sha256_file(path)
+
+    # upload, thumbnails and vision each stream/decode from the spool file;
+    # a retry may find the photo already uploaded
+    if dict(box).get("photo") != key:
+        photo_key = store_photo(box_id, path, key, content_type, sha256)
+        if thumbnails.enabled() and claim_photo_variants(box_id):
+            try:
+                set_photo_variants(box_id, photo_key, thumbnails.generate_and_upload(photo_key, path))
+            except Exception:
+                log.exception("thumbnails for box %s failed; retrying from S3", box_id)
+                enqueue(THUMBNAILS, box_id, {"key": photo_key})
+
+    result = detect_items_json(path, content_type, sha256=sha256)
+    # "Steel Pot" / "steel pots" / "stainless pot" -> one row, highest confidence wins
+    merged = merge_duplicates((it["name"], it["confidence"]) for it in result.get("items", []))
+    items = [(name, conf, None, None) for name, conf in merged]
+    replace_items(box_id, items)  # idempotent across retries
+    update_box_analysis(
+        box_id,
+        name=(result.get("box_name") or "Unlabeled Box"),
+        notes=result.get("notes", ""),
+        status="enriching" if items else "ready",
+    )
+    if items:
+        enqueue(ENRICH, box_id)
+    drop_spool(path)
+
+
+def _analyze_gave_up(box_id: int, payload: dict, error: str) -> None:
+    # same outcome the inline path had: keep the box, note the failure
+    if get_box(box_id):
+        update_box_analysis(box_id, "Unlabeled Box", f"(analysis failed: {error})"[:300], "failed")
+    drop_spool(payload.get("path"))
+
+
+def _enrich(box_id: int, payload: dict) -> None:
+    """(Re-)enrich items whose lookups have not completed yet."""
+    if not get_box(box_id):
+        return
+    rows = get_unenriched_items(box_id)
+    if rows:
+        enriched = enrich_items([{"name": r["name"], "confidence": r["confidence"]} for r in rows])
+        update_items_enrichment([(r["id"], img, price) for r, (_, _, img, price) in zip(rows, enriched)])
+        missing = sum(1 for (_, _, img, _) in enriched if img is None)
+        if missing:
+            raise RuntimeError(f"{missing} item(s) still missing enrichment")
+    set_box_status(box_id, "ready")
+
+
+def _enrich_gave_up(box_id: int, payload: dict, error: str) -> None:
+    # items are already saved; just stop showing the spinner
+    if get_box(box_id):
+        set_box_status(box_id, "ready")
+
+
+def _thumbnails(box_id: int, payload: dict) -> None:
+    """WebP variants for a photo: from the spooled upload if given, else from S3."""
+    box = get_box(box_id)
+    key = payload["key"]
+    if not box or dict(box).get("photo") != key:
+        drop_spool(payload.get("path"))
+        return  # box gone or photo replaced again; that photo gets its own job
+    if payload.get("path") and os.path.exists(payload["path"]):
+        source = payload["path"]
+    else:
+        source = download_bytes(key)
+    set_photo_variants(box_id, key, thumbnails.generate_and_upload(key, source))
+    drop_spool(payload.get("path"))
+
+
+def _thumbnails_gave_up(box_id: int, payload: dict, error: str) -> None:
+    # leave photo_variants as '[]' so pages stop asking; the original still renders
+    drop_spool(payload.get("path"))
+
+
+ANALYZE = "analyze"
+ENRICH = "enrich"
+THUMBNAILS = "thumbnails"
+
+_HANDLERS: Dict[str, Callable[[int, dict], None]] = {
+    ANALYZE: _analyze, ENRICH: _enrich, THUMBNAILS: _thumbnails,
+}
+_GIVE_UP: Dict[str, Callable[[int, dict, str], None]] = {
+    ANALYZE: _analyze_gave_up, ENRICH: _enrich_gave_up, THUMBNAILS: _thumbnails_gave_up,
+}
+
+
+# ---------- queue ----------
+
+@timed("spool")
+def spool_upload(stream: BinaryIO, ext: str, name: str) -> Tuple[str, str, int]:
+    """
+    Copy an upload stream to local disk chunk by chunk, hashing on the way,
+    so the request never holds the whole file. Returns (path, sha256, size).
+    """
+    SPOOL_DIR.mkdir(parents=True, exist_ok=True)
+    fd, path = tempfile.mkstemp(prefix=f"{name}-", suffix=ext, dir=SPOOL_DIR)
+    h, size = hashlib.sha256(), 0
+    with os.fdopen(fd, "wb") as f:
+        for chunk in iter(lambda: stream.read(SPOOL_CHUNK), b""):
+            h.update(chunk)
+            f.write(chunk)
+            size += len(chunk)
+    return path, h.hexdigest(), size
+
+
+def drop_spool(path: Optional[str]) -> None:
+    if not path:
+        return
+    try:
+        os.remove(path)
+    except Exception:
+        pass
+
+
+def put_photo(path: str, key: str, content_type: str, sha256: str) -> Tuple[str, Optional[List[int]]]:
+    """
+    Make sure a (content-addressed) photo is in S3, streamed from `path`.
+    Returns (key, thumbnail widths); widths are known only if another box
+    already has the bytes.
+    """
+    existing = find_photo_by_sha256(sha256)
+    if existing and existing["photo"] == key:
+        try:
+            return key, [int(w) for w in json.loads(existing["photo_variants"] or "[]")] or None
+        except (TypeError, ValueError):
+            return key, None
+    if not object_exists(key):
+        with open(path, "rb") as f:
+            key = upload_fileobj(f, key, extra={"ContentType": content_type})
+    return key, None
+
+
+def store_photo(box_id: int, path: str, key: str, content_type: str, sha256: str) -> str:
+    """
+    Point a box at its photo. Bytes already stored for another box are
+    neither uploaded again nor re-thumbnailed.
+    """
+    key, variants = put_photo(path, key, content_type, sha256)
+    update_box_photo(box_id, key, sha256=sha256, phash=dhash_hex(path), variants=variants)
+    return key
+
+
+def request_thumbnails(box_id: int, photo_key: str, path: Optional[str] = None) -> bool:
+    """Queue thumbnail generation once per photo; False if already done/claimed."""
+    if not thumbnails.enabled() or not claim_photo_variants(box_id):
+        drop_spool(path)
+        return False
+    enqueue(THUMBNAILS, box_id, {"key": photo_key, "path": path})
+    return True
+
+
+def enqueue(kind: str, box_id: int, payload: Optional[dict] = None) -> int:
+    job_id = enqueue_job(kind, box_id, payload, max_attempts=JOB_MAX_ATTEMPTS)
+    _wake.set()
+    return job_id
+
+
+def insert_boxes_with_jobs(boxes: List[dict]) -> List[int]:
+    """
+    insert_boxes_batch (one transaction), queueing b["job_kind"] with
+    b["payload"] for every box dict that names one.
+    """
+    queued = False
+    for b in boxes:
+        kind = b.pop("job_kind", None)
+        if kind:
+            b["job"] = (kind, b.pop("payload", None), JOB_MAX_ATTEMPTS)
+            queued = True
+    ids = insert_boxes_batch(boxes)
+    if queued:
+        _wake.set()
+    return ids
+
+
+def run_job(job: dict) -> None:
+    kind, box_id, payload = job["kind"], job["box_id"], job["payload"]
+    handler = _HANDLERS.get(kind)
+    if handler is None:
+        finish_job(job["id"], "failed", f"unknown job kind {kind!r}")
+        return
+    try:
+        handler(box_id, payload)
+    except Exception as e:
+        err = f"{type(e).__name__}: {e}"
+        if job["attempts"] < job["max_attempts"]:
+            delay = JOB_RETRY_BASE_S * (2 ** (job["attempts"] - 1))
+            log.warning("job %s (%s box=%s) attempt %s failed, retrying in %.0fs: %s",
+                        job["id"], kind, box_id, job["attempts"], delay, err)
+            finish_job(job["id"], error=err, retry_in_s=delay)
+        else:
+            log.error("job %s (%s box=%s) gave up after %s attempts: %s",
+                      job["id"], kind, box_id, job["attempts"], err)
+            finish_job(job["id"], "failed", err)
+            try:
+                _GIVE_UP[kind](box_id, payload, str(e))
+            except Exception:
+                log.exception("give-up hook for job %s failed", job["id"])
+        return
+    finish_job(job["id"], "done")
+
+
+def _purge_lookup_cache_if_due() -> None:
+    """Idle workers drop expired lookup_cache rows, at most once per LOOKUP_CACHE_PURGE_INTERVAL_S."""
+    global _next_purge
+    with _purge_lock:
+        if time.time() < _next_purge:
+            return
+        _next_purge = time.time() + PURGE_INTERVAL_S
+    try:
+        purged = lookup_cache.purge_expired()
+        if purged:
+            log.info("purged %d expired lookup_cache rows", purged)
+    except Exception:
+        log.exception("purging lookup_cache failed")
+
+
+def _worker_loop() -> None:
+    while True:
+        try:
+            job = claim_job(JOB_STALE_S)
+        except Exception:
+            log.exception("claiming job failed")
+            job = None
+        if job is None:
+            _purge_lookup_cache_if_due()
+            _wake.wait(JOB_POLL_S)
+            _wake.clear()
+            continue
+        run_job(job)
+
+
+def start_workers(n: Optional[int] = None) -> None:
+    """Start the in-process worker pool once per process (JOB_WORKERS=0 disables it)."""
+    n = JOB_WORKERS if n is None else n
+    with _start_lock:
+        if _threads or n <= 0:
+            return
+        for i in range(n):
+            t = threading.Thread(target=_worker_loop, name=f"job-worker-{i}", daemon=True)
+            t.start()
+            _threads.append(t)
@@ -0,0 +1,147 @@
+import functools, os, threading, time
+from contextlib import contextmanager
+from typing import Dict, List, Tuple
+
+from flask import g, has_request_context, request
+
+METRICS_PREFIX = os.getenv("METRICS_PREFIX", "inventoryiq")
+BUCKETS_S: List[float] = [
+    float(b) for b in os.getenv(
+        "METRICS_BUCKETS_S", "0.001,0.005,0.01,0.025,0.05,0.1,0.25,0.5,1,2.5,5,10,30"
+    ).split(",") if b.strip()
+]
+
+
+class _Histogram:
+    """Cumulative-bucket latency histogram keyed by a label tuple (per process)."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._series: Dict[Tuple[str, ...], dict] = {}
+
+    def observe(self, labels: Tuple[str, ...], seconds: float, error: bool = False) -> None:
+        with self._lock:
+            s = self._series.get(labels)
+            if s is None:
+                s = self._series[labels] = {"buckets": [0] * len(BUCKETS_S), "count": 0, "sum": 0.0, "errors": 0}
+            for i, bound in enumerate(BUCKETS_S):
+                if seconds <= bound:
+                    s["buckets"][i] += 1
+            s["count"] += 1
+            s["sum"] += seconds
+            s["errors"] += int(error)
+
+    def snapshot(self) -> Dict[Tuple[str, ...], dict]:
+        with self._lock:
+            return {k: dict(v, buckets=list(v["buckets"])) for k, v in self._series.items()}
+
+
+stages = _Histogram()          # labels: (stage,)
+http_requests = _Histogram()   # labels: (endpoint, method, status)
+
+
+# ---------- instrumentation ----------
+
+def _record(stage: str, seconds: float, error: bool) -> None:
+    stages.observe((stage,), seconds, error)
+    if has_request_context():
+        # Server-Timing groups by the part before the dot: db.get_items -> db
+        name = stage.split(".", 1)[0]
+        timings = g.setdefault("_stage_timings", {})
+        total, calls = timings.get(name, (0.0, 0))
+        timings[name] = (total + seconds, calls + 1)
+
+
+@contextmanager
+def timer(stage: str):
+    start = time.perf_counter()
+    try:
+        yield
+    except Exception:
+        _record(stage, time.perf_counter() - start, error=True)
+        raise
+    _record(stage, time.perf_counter() - start, error=False)
+
+
+def timed(stage: str):
+    """Decorator form of timer(); the wrapped function is kept on `.untimed`."""
+    def deco(fn):
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            with timer(stage):
+                return fn(*args, **kwargs)
+        wrapper.untimed = fn
+        return wrapper
+    return deco
+
+
+# ---------- exposition ----------
+
+def _escape(value: str) -> str:
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _labels(names: Tuple[str, ...], values: Tuple[str, ...], le: str = "") -> str:
+    parts = [f'{n}="{_escape(v)}"' for n, v in zip(names, values)]
+    if le:
+        parts.append(f'le="{le}"')
+    return "{" + ",".join(parts) + "}"
+
+
+def _histogram_lines(name: str, help_text: str, names: Tuple[str, ...],
+                     hist: _Histogram) -> Tuple[List[str], List[Tuple[Tuple[str, ...], int]]]:
+    """Exposition lines for a histogram, plus (labels, error count) per series."""
+    lines = [f"# HELP {name} {help_text}", f"# TYPE {name} histogram"]
+    errors = []
+    for values, s in sorted(hist.snapshot().items()):
+        for bound, n in zip(BUCKETS_S, s["buckets"]):
+            lines.append(f"{name}_bucket{_labels(names, values, f'{bound:g}')} {n}")
+        lines.append(f"{name}_bucket{_labels(names, values, '+Inf')} {s['count']}")
+        lines.append(f"{name}_sum{_labels(names, values)} {s['sum']:.6f}")
+        lines.append(f"{name}_count{_labels(names, values)} {s['count']}")
+        errors.append((values, s["errors"]))
+    return lines, errors
+
+
+def render_prometheus() -> str:
+    """Text exposition format (version 0.0.4) for every series in this process."""
+    p = METRICS_PREFIX
+    lines, stage_errors = _histogram_lines(
+        f"{p}_stage_duration_seconds", "Time spent per stage (vision, s3, lookups, db queries).",
+        ("stage",), stages)
+    lines += [f"# HELP {p}_stage_errors_total Stage calls that raised.",
+              f"# TYPE {p}_stage_errors_total counter"]
+    lines += [f"{p}_stage_errors_total{_labels(('stage',), v)} {n}" for v, n in stage_errors]
+    http_lines, _ = _histogram_lines(
+        f"{p}_http_request_duration_seconds", "Request latency by endpoint, method and status.",
+        ("endpoint", "method", "status"), http_requests)
+    lines += http_lines
+    return "\n".join(lines) + "\n"
+
+
+def server_timing_header(total_s: float) -> str:
+    timings = g.get("_stage_timings") or {}
+    parts = [f'{name};dur={secs * 1000:.1f};desc="{calls} call{"" if calls == 1 else "s"}"'
+             for name, (secs, calls) in sorted(timings.items(), key=lambda kv: -kv[1][0])]
+    parts.append(f"total;dur={total_s * 1000:.1f}")
+    return ", ".join(parts)
+
+
+def init_app(app) -> None:
+    """Time every request and attach a Server-Timing header with the stage breakdown."""
+
+    @app.before_request
+    def _start_timer():
+        g._request_started = time.perf_counter()
+
+    @app.after_request
+    def _finish_timer(response):
+        started = g.pop("_request_started", None)
+        if started is None:
+            return response
+        elapsed = time.perf_counter() - started
+        endpoint = request.endpoint or "unmatched"
+        http_requests.observe((endpoint, request.method, str(response.status_code)), elapsed,
+                              error=response.status_code >= 500)
+        response.headers["Server-Timing"] = server_timing_header(elapsed)
+        return response
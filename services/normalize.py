@@ -0,0 +1,135 @@
+"""
+Item-name normalization: 'Steel Pots', '  steel pot ' and 'stainless pot'
+all map to one canonical name ('steel pot'), which is stored next to the
+display name in items.canonical_name and used as the enrichment cache key.
+
+Rules: lowercase, punctuation -> space, collapsed whitespace, every word
+singular, then the item_aliases table (exact names first, then whole-word
+phrases, longest first). Alias keys go through the same folding as names,
+so 'xmas' matches 'Xmas Lights' and 'torch' matches 'Torches'.
+"""
+import os, re, sqlite3, threading, time
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from db.connection import get_db
+
+ALIAS_RELOAD_S = float(os.getenv("ITEM_ALIAS_RELOAD_S", "60"))
+
+# plural-looking words that are already singular, or have no singular
+_INVARIANT = {
+    "pliers", "scissors", "tongs", "glasses", "goggles", "pants", "shorts", "jeans", "clothes",
+    "christmas", "xmas", "series", "news", "chess", "dice", "lego", "gas", "bus", "bass", "canvas",
+    "atlas", "species",
+}
+_IRREGULAR = {
+    "knives": "knife", "shelves": "shelf", "leaves": "leaf", "mice": "mouse", "children": "child",
+    "feet": "foot", "teeth": "tooth", "people": "person", "men": "man", "women": "woman",
+}
+# singulars ending in -e whose plural looks like -ies/-ches/-shes/-xes; they just drop the "s"
+_E_SINGULAR = {
+    "cookie", "movie", "zombie", "hoodie", "beanie", "brownie", "smoothie", "rookie", "necktie",
+    "cache", "niche", "headache", "mustache", "moustache", "avalanche", "quiche", "cliche",
+    "axe",
+}
+
+
+def _singular(word: str) -> str:
+    if len(word) <= 3 or word in _INVARIANT:
+        return word
+    if word in _IRREGULAR:
+        return _IRREGULAR[word]
+    if word.endswith("s") and word[:-1] in _E_SINGULAR:
+        return word[:-1]
+    if word.endswith("ies"):
+        # pies, ties -> pie, tie; batteries -> battery
+        return word[:-1] if len(word) <= 4 else word[:-3] + "y"
+    if word.endswith(("sses", "ches", "shes", "xes", "zzes")):
+        return word[:-2]
+    if word.endswith("s") and not word.endswith(("ss", "us", "is")):
+        return word[:-1]
+    return word
+
+
+def basic_form(name: str) -> str:
+    """Case, punctuation, whitespace and plural folding (no aliases)."""
+    return " ".join(_singular(w) for w in re.sub(r"[^\w\s]", " ", (name or "").lower()).split())
+
+
+class NameMatcher:
+    """Alias table compiled into a dict (whole names) plus one regex (phrases)."""
+
+    def __init__(self, aliases: Dict[str, str]):
+        self.aliases = {basic_form(a): basic_form(c) for a, c in aliases.items() if basic_form(a)}
+        phrases = sorted(self.aliases, key=len, reverse=True)
+        self._pattern = (re.compile(r"\b(?:" + "|".join(map(re.escape, phrases)) + r")\b")
+                         if phrases else None)
+
+    def canonical(self, name: str) -> str:
+        base = basic_form(name)
+        if base in self.aliases:
+            return self.aliases[base]
+        if self._pattern is None:
+            return base
+        return " ".join(self._pattern.sub(lambda m: self.aliases[m.group(0)], base).split())
+
+
+def load_aliases(con=None) -> Dict[str, str]:
+    """alias -> canonical from item_aliases; {} before the table exists."""
+    own = con is None
+    con = con or get_db()
+    try:
+        return {r["alias"]: r["canonical"] for r in con.execute("SELECT alias, canonical FROM item_aliases")}
+    except sqlite3.OperationalError:
+        return {}
+    finally:
+        if own:
+            con.close()
+
+
+_matcher: Optional[NameMatcher] = None
+_loaded_at = 0.0
+_lock = threading.Lock()
+
+
+def get_matcher() -> NameMatcher:
+    """
+    The process-wide matcher, reloaded every ITEM_ALIAS_RELOAD_S so alias
+    edits from other workers show up. Loading uses (and closes) this thread's
+    connection, so call it before opening a write transaction.
+    """
+    global _matcher, _loaded_at
+    if _matcher is None or time.monotonic() - _loaded_at > ALIAS_RELOAD_S:
+        with _lock:
+            if _matcher is None or time.monotonic() - _loaded_at > ALIAS_RELOAD_S:
+                _matcher = NameMatcher(load_aliases())
+                _loaded_at = time.monotonic()
+    return _matcher
+
+
+def invalidate() -> None:
+    """Drop the compiled matcher (after editing item_aliases in this process)."""
+    global _matcher
+    with _lock:
+        _matcher = None
+
+
+def canonical_name(name: str) -> str:
+    return get_matcher().canonical(name)
+
+
+def merge_duplicates(items: Iterable[Tuple[str, float]]) -> List[Tuple[str, float]]:
+    """
+    One (name, confidence) per canonical name, in first-seen order. The
+    highest-confidence spelling wins and keeps its confidence.
+    """
+    matcher = get_matcher()
+    best: Dict[str, Tuple[str, float]] = {}
+    for name, conf in items:
+        name = " ".join((name or "").split())
+        key = matcher.canonical(name)
+        if not key:
+            continue
+        conf = float(conf or 0.0)
+        if key not in best or conf > best[key][1]:
+            best[key] = (name, conf)
+    return list(best.values())
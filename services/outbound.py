@@ -0,0 +1,327 @@
+import asyncio, atexit, json, os, threading, time
+from concurrent.futures import Future, TimeoutError as FutureTimeout
+from typing import Awaitable, Dict, Iterable, Optional, TypeVar
+from urllib.parse import urlsplit
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+HTTP_POOL_MAXSIZE = int(os.getenv("HTTP_POOL_MAXSIZE", "32"))
+HTTP_RETRIES = int(os.getenv("HTTP_RETRIES", "2"))
+HTTP_BACKOFF_S = float(os.getenv("HTTP_BACKOFF_S", "0.3"))
+BREAKER_FAILURES = int(os.getenv("HTTP_BREAKER_FAILURES", "5"))
+BREAKER_RESET_S = float(os.getenv("HTTP_BREAKER_RESET_S", "30"))
+# image/price lookups run on one asyncio loop via aiohttp when it is installed
+HTTP_ASYNC = os.getenv("HTTP_ASYNC", "1").lower() not in ("0", "false", "no")
+HTTP_ASYNC_MAX_CONNECTIONS = int(os.getenv("HTTP_ASYNC_MAX_CONNECTIONS", "100"))
+HTTP_ASYNC_PER_HOST = int(os.getenv("HTTP_ASYNC_PER_HOST", str(HTTP_POOL_MAXSIZE)))
+RETRY_STATUSES = (429, 500, 502, 503, 504)
+
+T = TypeVar("T")
+
+
+class CircuitOpen(requests.RequestException):
+    """Raised instead of calling a provider that has been failing."""
+
+
+def timeout_for(provider: str, default: float) -> float:
+    """HTTP_TIMEOUT_<PROVIDER> overrides a call site's default timeout."""
+    v = os.getenv(f"HTTP_TIMEOUT_{provider.upper()}")
+    try:
+        return float(v) if v else default
+    except ValueError:
+        return default
+
+
+class _Breaker:
+    """
+    Consecutive-failure circuit breaker. After BREAKER_FAILURES failures the
+    provider is skipped for BREAKER_RESET_S, then one trial call is let
+    through (half-open); success closes it, failure re-opens it.
+    """
+
+    def __init__(self):
+        self.failures = 0
+        self.opened_at: Optional[float] = None
+        self.trial_in_flight = False
+
+    @property
+    def state(self) -> str:
+        if self.opened_at is None:
+            return "closed"
+        if time.monotonic() - self.opened_at >= BREAKER_RESET_S:
+            return "half_open"
+        return "open"
+
+    def allow(self) -> bool:
+        state = self.state
+        if state == "closed":
+            return True
+        if state == "half_open" and not self.trial_in_flight:
+            self.trial_in_flight = True
+            return True
+        return False
+
+    def record(self, ok: bool) -> None:
+        self.trial_in_flight = False
+        if ok:
+            self.failures, self.opened_at = 0, None
+            return
+        self.failures += 1
+        if self.failures >= BREAKER_FAILURES or self.opened_at is not None:
+            self.opened_at = time.monotonic()
+
+
+class OutboundClient:
+    """
+    One keep-alive requests.Session for every external provider, with per-host
+    connection pools, retry/backoff on connect errors and 429/5xx, a circuit
+    breaker per provider and per-host latency/error counters.
+    """
+
+    def __init__(self):
+        retry = Retry(
+            total=HTTP_RETRIES, connect=HTTP_RETRIES, read=0, status=HTTP_RETRIES,
+            backoff_factor=HTTP_BACKOFF_S, status_forcelist=RETRY_STATUSES,
+            allowed_methods=frozenset({"GET"}), raise_on_status=False,
+        )
+        adapter = HTTPAdapter(pool_connections=16, pool_maxsize=HTTP_POOL_MAXSIZE, max_retries=retry)
+        self.session = requests.Session()
+        self.session.mount("https://", adapter)
+        self.session.mount("http://", adapter)
+        self._lock = threading.Lock()
+        self._breakers: Dict[str, _Breaker] = {}
+        self._hosts: Dict[str, Dict[str, float]] = {}
+
+    def _breaker(self, provider: str) -> _Breaker:
+        b = self._breakers.get(provider)
+        if b is None:
+            b = self._breakers.setdefault(provider, _Breaker())
+        return b
+
+    def _observe(self, host: str, elapsed: float, error: bool) -> None:
+        with self._lock:
+            h = self._hosts.setdefault(host, {"requests": 0, "errors": 0, "total_s": 0.0, "max_s": 0.0})
+            h["requests"] += 1
+            h["errors"] += int(error)
+            h["total_s"] += elapsed
+            h["max_s"] = max(h["max_s"], elapsed)
+
+    def admit(self, provider: str) -> _Breaker:
+        """The provider's breaker, or CircuitOpen if it is not taking calls right now."""
+        with self._lock:
+            breaker = self._breaker(provider)
+            allowed = breaker.allow()
+        if not allowed:
+            raise CircuitOpen(f"{provider} circuit open")
+        return breaker
+
+    def settle(self, breaker: _Breaker, host: str, elapsed: float, failed: Optional[bool]) -> None:
+        """Record a finished call; failed=None (abandoned call) only frees a half-open trial."""
+        if failed is None:
+            with self._lock:
+                breaker.trial_in_flight = False
+            return
+        self._observe(host, elapsed, error=failed)
+        with self._lock:
+            breaker.record(ok=not failed)
+
+    def request(self, provider: str, method: str, url: str, timeout: float = 10, **kwargs) -> requests.Response:
+        breaker = self.admit(provider)
+        host = urlsplit(url).netloc
+        start = time.perf_counter()
+        try:
+            r = self.session.request(method, url, timeout=timeout_for(provider, timeout), **kwargs)
+        except requests.RequestException:
+            self.settle(breaker, host, time.perf_counter() - start, failed=True)
+            raise
+        failed = r.status_code == 429 or r.status_code >= 500
+        self.settle(breaker, host, time.perf_counter() - start, failed)
+        return r
+
+    def get(self, provider: str, url: str, **kwargs) -> requests.Response:
+        return self.request(provider, "GET", url, **kwargs)
+
+    def post(self, provider: str, url: str, **kwargs) -> requests.Response:
+        return self.request(provider, "POST", url, **kwargs)
+
+    def stats(self) -> dict:
+        with self._lock:
+            hosts = {
+                host: dict(h, avg_s=(h["total_s"] / h["requests"]) if h["requests"] else 0.0)
+                for host, h in self._hosts.items()
+            }
+            breakers = {p: {"state": b.state, "failures": b.failures} for p, b in self._breakers.items()}
+        return {"hosts": hosts, "breakers": breakers}
+
+
+client = OutboundClient()
+
+
+# ---------- asyncio ----------
+
+class AsyncResponse:
+    """The bits of requests.Response the provider code reads, for aiohttp calls."""
+
+    def __init__(self, status_code: int, content: bytes):
+        self.status_code = status_code
+        self.content = content
+
+    @property
+    def ok(self) -> bool:
+        return self.status_code < 400
+
+    def json(self):
+        return json.loads(self.content)
+
+
+class AsyncOutboundClient:
+    """
+    aiohttp counterpart of OutboundClient for the provider event loop. Shares
+    `client`'s breakers and host stats; GETs retry connect errors and
+    429/5xx with the same backoff. Takes requests-style kwargs (params,
+    headers, data, auth tuple, timeout) and returns an AsyncResponse.
+    """
+
+    def __init__(self, sync: OutboundClient, **session_kwargs):
+        import aiohttp
+
+        self._aiohttp = aiohttp
+        self._sync = sync
+        self._session = aiohttp.ClientSession(
+            connector=aiohttp.TCPConnector(limit=HTTP_ASYNC_MAX_CONNECTIONS, limit_per_host=HTTP_ASYNC_PER_HOST),
+            **session_kwargs,
+        )
+
+    async def _send(self, method: str, url: str, timeout: float, auth=None, **kwargs) -> AsyncResponse:
+        if auth is not None:
+            auth = self._aiohttp.BasicAuth(*auth)
+        async with self._session.request(method, url, auth=auth,
+                                         timeout=self._aiohttp.ClientTimeout(total=timeout), **kwargs) as r:
+            return AsyncResponse(r.status, await r.read())
+
+    async def request(self, provider: str, method: str, url: str, timeout: float = 10, **kwargs) -> AsyncResponse:
+        breaker = self._sync.admit(provider)
+        host = urlsplit(url).netloc
+        attempts = 1 + (HTTP_RETRIES if method == "GET" else 0)
+        start = time.perf_counter()
+        try:
+            for attempt in range(attempts):
+                last = attempt + 1 == attempts
+                try:
+                    r = await self._send(method, url, timeout_for(provider, timeout), **kwargs)
+                except self._aiohttp.ClientConnectorError:
+                    if last:
+                        raise
+                else:
+                    if last or r.status_code not in RETRY_STATUSES:
+                        break
+                await asyncio.sleep(HTTP_BACKOFF_S * (2 ** attempt))
+        except asyncio.CancelledError:
+            self._sync.settle(breaker, host, 0.0, failed=None)
+            raise
+        except (self._aiohttp.ClientError, asyncio.TimeoutError):
+            self._sync.settle(breaker, host, time.perf_counter() - start, failed=True)
+            raise
+        failed = r.status_code == 429 or r.status_code >= 500
+        self._sync.settle(breaker, host, time.perf_counter() - start, failed)
+        return r
+
+    async def close(self) -> None:
+        await self._session.close()
+
+    async def get(self, provider: str, url: str, **kwargs) -> AsyncResponse:
+        return await self.request(provider, "GET", url, **kwargs)
+
+    async def post(self, provider: str, url: str, **kwargs) -> AsyncResponse:
+        return await self.request(provider, "POST", url, **kwargs)
+
+
+_loop: Optional[asyncio.AbstractEventLoop] = None
+_loop_lock = threading.Lock()
+_async_client: Optional[AsyncOutboundClient] = None
+_async_session_kwargs: dict = {}
+_aiohttp_installed: Optional[bool] = None
+
+
+def async_enabled() -> bool:
+    """HTTP_ASYNC is on and aiohttp is importable."""
+    global _aiohttp_installed
+    if not HTTP_ASYNC:
+        return False
+    if _aiohttp_installed is None:
+        try:
+            import aiohttp  # noqa: F401
+            _aiohttp_installed = True
+        except ImportError:
+            _aiohttp_installed = False
+    return _aiohttp_installed
+
+
+def _get_loop() -> asyncio.AbstractEventLoop:
+    """One event loop per process, on a daemon thread started on first use (after any fork)."""
+    global _loop
+    with _loop_lock:
+        if _loop is None:
+            _loop = asyncio.new_event_loop()
+            threading.Thread(target=_loop.run_forever, name="providers-aio", daemon=True).start()
+        return _loop
+
+
+def async_client() -> AsyncOutboundClient:
+    """The shared async client; only call from coroutines running on the provider loop."""
+    global _async_client
+    if _async_client is None:
+        _async_client = AsyncOutboundClient(client, **_async_session_kwargs)
+    return _async_client
+
+
+def configure_async_session(**session_kwargs) -> None:
+    """Extra aiohttp.ClientSession kwargs (e.g. request_class for stub servers); applies to the next client."""
+    global _async_session_kwargs, _async_client
+    _async_session_kwargs, _async_client = session_kwargs, None
+
+
+@atexit.register
+def _close_async_client() -> None:
+    if _loop is not None and _async_client is not None:
+        try:
+            asyncio.run_coroutine_threadsafe(_async_client.close(), _loop).result(timeout=2)
+        except Exception:
+            pass
+
+
+def submit(coro: Awaitable[T]) -> "Future[T]":
+    return asyncio.run_coroutine_threadsafe(coro, _get_loop())
+
+
+def run_async(coro: Awaitable[T], timeout: Optional[float] = None) -> T:
+    """Sync facade: run `coro` on the provider loop and wait for it (cancelled on timeout)."""
+    f = submit(coro)
+    try:
+        return f.result(timeout)
+    except FutureTimeout:
+        f.cancel()
+        raise
+
+
+async def first_in_priority(aws: Iterable[Awaitable[Optional[T]]]) -> Optional[T]:
+    """
+    Start every awaitable at once; return the first non-None result in the
+    given (priority) order, cancelling whatever is still running.
+    Exceptions count as no result.
+    """
+    tasks = [asyncio.ensure_future(a) for a in aws]
+    try:
+        for t in tasks:
+            try:
+                result = await t
+            except Exception:
+                continue
+            if result is not None:
+                return result
+        return None
+    finally:
+        for t in tasks:
+            t.cancel()
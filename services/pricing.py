@@ -1,50 +1,145 @@
-import os, re, requests
-from typing import Optional
+import asyncio, os, re, threading, time
+from concurrent.futures import ThreadPoolExecutor
+from typing import List, Optional, Tuple
 
+from services.cache import PRICE_TTL_S, cached_lookup, lookup_cache
+from services.metrics import timed
+from services.outbound import async_client, async_enabled, client, first_in_priority, run_async
+
+KROGER_TOKEN_URL = "https://api.kroger.com/v1/connect/oauth2/token"
+KROGER_LOCATIONS_URL = "https://api.kroger.com/v1/locations"
+KROGER_PRODUCTS_URL = "https://api.kroger.com/v1/products"
 DEFAULT_CITY = os.getenv("DEFAULT_CITY", "Naperville, IL")
 DEFAULT_ZIP = os.getenv("DEFAULT_ZIP", "60540")
 SERPAPI_KEY = os.getenv("SERPAPI_KEY")
 KROGER_CLIENT_ID = os.getenv("KROGER_CLIENT_ID")
 KROGER_CLIENT_SECRET = os.getenv("KROGER_CLIENT_SECRET")
+KROGER_TOKEN_MARGIN_S = float(os.getenv("KROGER_TOKEN_MARGIN_S", "60"))
+KROGER_LOCATION_TTL_S = float(os.getenv("KROGER_LOCATION_TTL_S", str(7 * 24 * 3600)))
+KROGER_VARIANT_WORKERS = int(os.getenv("KROGER_VARIANT_WORKERS", "16"))
 
-def _kroger_token() -> Optional[str]:
+_variant_pool = ThreadPoolExecutor(max_workers=KROGER_VARIANT_WORKERS, thread_name_prefix="kroger")
+
+def _fetch_kroger_token() -> Tuple[Optional[str], float]:
+    """Returns (access_token, expires_in seconds)."""
     if not KROGER_CLIENT_ID or not KROGER_CLIENT_SECRET:
-        return None
+        return None, 0.0
     try:
-        r = requests.post(
-            "https://api.kroger.com/v1/connect/oauth2/token",
-            headers={"Content-Type": "application/x-www-form-urlencoded", "Accept": "application/json"},
-            data={"grant_type": "client_credentials", "scope": "product.compact"},
-            auth=(KROGER_CLIENT_ID, KROGER_CLIENT_SECRET),
-            timeout=12
-        )
+        r = client.post("kroger", KROGER_TOKEN_URL, **_kroger_token_request(), timeout=12)
         if r.ok:
-            return r.json().get("access_token")
+            return _kroger_token_pick(r.json())
     except Exception:
         pass
-    return None
+    return None, 0.0
+
+def _kroger_token_request() -> dict:
+    return {
+        "headers": {"Content-Type": "application/x-www-form-urlencoded", "Accept": "application/json"},
+        "data": {"grant_type": "client_credentials", "scope": "product.compact"},
+        "auth": (KROGER_CLIENT_ID, KROGER_CLIENT_SECRET),
+    }
+
+def _kroger_token_pick(body: dict) -> Tuple[Optional[str], float]:
+    return body.get("access_token"), float(body.get("expires_in") or 1800)
+
+class _KrogerTokenManager:
+    """
+    Reuses the client-credentials token until KROGER_TOKEN_MARGIN_S before it
+    expires. Concurrent callers that find it stale wait on one refresh.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        # created in aget(), on the provider loop: on Python 3.9 a Lock binds to
+        # the event loop current when it is constructed
+        self._alock: Optional[asyncio.Lock] = None
+        self._token: Optional[str] = None
+        self._expires_at = 0.0
+
+    def _fresh(self) -> Optional[str]:
+        if self._token and time.monotonic() < self._expires_at:
+            return self._token
+        return None
+
+    def get(self) -> Optional[str]:
+        token = self._fresh()
+        if token:
+            return token
+        with self._lock:
+            token = self._fresh()  # another thread may have refreshed while we waited
+            if token:
+                return token
+            token, expires_in = _fetch_kroger_token()
+            self._store(token, expires_in)
+            return token
+
+    async def aget(self) -> Optional[str]:
+        """get() for the provider loop: one async refresh, other coroutines wait on it."""
+        token = self._fresh()
+        if token:
+            return token
+        if self._alock is None:
+            self._alock = asyncio.Lock()
+        async with self._alock:
+            token = self._fresh()
+            if token:
+                return token
+            token, expires_in = await _fetch_kroger_token_async()
+            with self._lock:
+                self._store(token, expires_in)
+            return token
+
+    def _store(self, token: Optional[str], expires_in: float) -> None:
+        if token:
+            self._token = token
+            self._expires_at = time.monotonic() + max(0.0, expires_in - KROGER_TOKEN_MARGIN_S)
+
+    def invalidate(self, token: str) -> None:
+        with self._lock:
+            if self._token == token:
+                self._token, self._expires_at = None, 0.0
+
+_kroger_tokens = _KrogerTokenManager()
+
+def _kroger_token() -> Optional[str]:
+    return _kroger_tokens.get()
 
 def _kroger_nearest_location(token: str, postal_code: str) -> Optional[str]:
     try:
-        r = requests.get(
-            "https://api.kroger.com/v1/locations",
-            headers={"Authorization": f"Bearer {token}", "Accept": "application/json"},
-            params={"filter.zipCode.near": postal_code, "filter.limit": 5},
-            timeout=12
-        )
+        r = client.get("kroger", KROGER_LOCATIONS_URL, headers=_kroger_headers(token),
+                       params=_kroger_location_params(postal_code), timeout=12)
         if r.ok:
-            for loc in (r.json().get("data") or []):
-                loc_id = loc.get("locationId")
-                if loc_id:
-                    return loc_id
+            return _kroger_location_pick(r.json())
     except Exception:
         pass
     return None
 
-def _kroger_price_cents(token: str, location_id: str, query: str) -> Optional[int]:
-    if not query.strip():
-        return None
-    headers = {"Authorization": f"Bearer {token}", "Accept": "application/json"}
+def _kroger_headers(token: str) -> dict:
+    return {"Authorization": f"Bearer {token}", "Accept": "application/json"}
+
+def _kroger_location_params(postal_code: str) -> dict:
+    return {"filter.zipCode.near": postal_code, "filter.limit": 5}
+
+def _kroger_location_pick(body: dict) -> Optional[str]:
+    for loc in (body.get("data") or []):
+        loc_id = loc.get("locationId")
+        if loc_id:
+            return loc_id
+    return None
+
+def _kroger_location_for(token: str, postal_code: str) -> Optional[str]:
+    """Nearest store for a zip, memoized in the lookup cache (stores don't move)."""
+    key = (postal_code or "").strip()
+    loc = lookup_cache.get("kroger_location", key)
+    if isinstance(loc, str):
+        return loc
+    loc = _kroger_nearest_location(token, key)
+    if loc:
+        lookup_cache.set("kroger_location", key, loc, KROGER_LOCATION_TTL_S)
+    return loc
+
+def _kroger_variants(query: str) -> List[str]:
+    """Query variants in priority order, with no-op rewrites dropped."""
     base = query.strip()
     variants = [
         base,
@@ -56,68 +151,157 @@ def _kroger_price_cents(token: str, location_id: str, query: str) -> Optional[in
         f"Annie's {base}",
         f"Ritz {base}",
     ]
+    return list(dict.fromkeys(v.strip() for v in variants if v and v.strip()))
+
+def _kroger_variant_cents(token: str, location_id: str, q: str) -> Optional[int]:
+    """Cheapest price among the products returned for one search term."""
+    r = client.get("kroger", KROGER_PRODUCTS_URL, headers=_kroger_headers(token),
+                   params=_kroger_product_params(location_id, q), timeout=12)
+    if r.status_code == 401:
+        _kroger_tokens.invalidate(token)
+        return None
+    if not r.ok:
+        return None
+    return _cheapest_cents(r.json())
+
+def _kroger_product_params(location_id: str, q: str) -> dict:
+    return {"filter.locationId": location_id, "filter.term": q, "filter.limit": 16}
+
+def _cheapest_cents(body: dict) -> Optional[int]:
     best = None
-    for q in variants:
-        if not q:
-            continue
-        try:
-            r = requests.get(
-                "https://api.kroger.com/v1/products",
-                headers=headers,
-                params={"filter.locationId": location_id, "filter.term": q, "filter.limit": 16},
-                timeout=12
-            )
-            if not r.ok:
+    for prod in (body.get("data") or []):
+        for it in (prod.get("items") or []):
+            price = it.get("price") or {}
+            dollars = price.get("promo", price.get("regular"))
+            if dollars is None:
                 continue
-            for prod in (r.json().get("data") or []):
-                for it in (prod.get("items") or []):
-                    price = it.get("price") or {}
-                    dollars = price.get("promo", price.get("regular"))
-                    if dollars is None:
-                        continue
-                    try:
-                        cents = int(round(float(dollars) * 100))
-                    except Exception:
-                        continue
-                    if cents > 0 and (best is None or cents < best):
-                        best = cents
-        except Exception:
-            continue
-        if best is not None:
-            break
+            try:
+                cents = int(round(float(dollars) * 100))
+            except Exception:
+                continue
+            if cents > 0 and (best is None or cents < best):
+                best = cents
     return best
 
+def _kroger_price_cents(token: str, location_id: str, query: str) -> Optional[int]:
+    """
+    Search all distinct variants at once and return the first hit in priority
+    order: worst case is one request timeout instead of one per variant.
+    Variants still queued once an answer is known are cancelled.
+    """
+    if not query.strip():
+        return None
+    futures = [_variant_pool.submit(_kroger_variant_cents, token, location_id, q)
+               for q in _kroger_variants(query)]
+    try:
+        for f in futures:
+            try:
+                cents = f.result()
+            except Exception:
+                continue
+            if cents is not None:
+                return cents
+        return None
+    finally:
+        for f in futures:
+            f.cancel()
+
 def _serpapi_shopping_price_cents(query: str) -> Optional[int]:
     if not SERPAPI_KEY or not query.strip():
         return None
     try:
-        r = requests.get(
-            "https://serpapi.com/search.json",
-            params={"engine": "google_shopping", "q": query, "api_key": SERPAPI_KEY,
-                    "gl": "us", "hl": "en", "num": 10},
-            timeout=12
-        )
+        r = client.get("serpapi", "https://serpapi.com/search.json", params=_shopping_params(query), timeout=12)
         if not r.ok:
             return None
-        for item in (r.json().get("shopping_results") or []):
-            price_str = (item.get("price") or "").strip()
-            if not price_str:
-                continue
-            m = re.search(r"\$([\d,]+(?:\.\d{1,2})?)", price_str)
-            if not m:
-                continue
-            dollars = float(m.group(1).replace(",", ""))
-            cents = int(round(dollars * 100))
-            if cents > 0:
-                return cents
+        return _shopping_pick(r.json())
     except Exception:
         return None
+
+def _shopping_params(query: str) -> dict:
+    return {"engine": "google_shopping", "q": query, "api_key": SERPAPI_KEY, "gl": "us", "hl": "en", "num": 10}
+
+def _shopping_pick(body: dict) -> Optional[int]:
+    for item in (body.get("shopping_results") or []):
+        price_str = (item.get("price") or "").strip()
+        if not price_str:
+            continue
+        m = re.search(r"\$([\d,]+(?:\.\d{1,2})?)", price_str)
+        if not m:
+            continue
+        dollars = float(m.group(1).replace(",", ""))
+        cents = int(round(dollars * 100))
+        if cents > 0:
+            return cents
     return None
 
+# ---------- async (one event loop; variants and items all at once) ----------
+
+async def _fetch_kroger_token_async() -> Tuple[Optional[str], float]:
+    if not KROGER_CLIENT_ID or not KROGER_CLIENT_SECRET:
+        return None, 0.0
+    try:
+        r = await async_client().post("kroger", KROGER_TOKEN_URL, **_kroger_token_request(), timeout=12)
+        if r.ok:
+            return _kroger_token_pick(r.json())
+    except Exception:
+        pass
+    return None, 0.0
+
+async def _kroger_location_for_async(token: str, postal_code: str) -> Optional[str]:
+    key = (postal_code or "").strip()
+    loc = await asyncio.to_thread(lookup_cache.get, "kroger_location", key)  # SQLite stays off the loop
+    if isinstance(loc, str):
+        return loc
+    try:
+        r = await async_client().get("kroger", KROGER_LOCATIONS_URL, headers=_kroger_headers(token),
+                                     params=_kroger_location_params(key), timeout=12)
+        loc = _kroger_location_pick(r.json()) if r.ok else None
+    except Exception:
+        loc = None
+    if loc:
+        await asyncio.to_thread(lookup_cache.set, "kroger_location", key, loc, KROGER_LOCATION_TTL_S)
+    return loc
+
+async def _kroger_variant_cents_async(token: str, location_id: str, q: str) -> Optional[int]:
+    r = await async_client().get("kroger", KROGER_PRODUCTS_URL, headers=_kroger_headers(token),
+                                 params=_kroger_product_params(location_id, q), timeout=12)
+    if r.status_code == 401:
+        _kroger_tokens.invalidate(token)
+        return None
+    return _cheapest_cents(r.json()) if r.ok else None
+
+async def _serpapi_shopping_price_cents_async(query: str) -> Optional[int]:
+    if not SERPAPI_KEY or not query.strip():
+        return None
+    try:
+        r = await async_client().get("serpapi", "https://serpapi.com/search.json",
+                                     params=_shopping_params(query), timeout=12)
+        return _shopping_pick(r.json()) if r.ok else None
+    except Exception:
+        return None
+
+async def price_for_name_async(name: str, postal_code: str = DEFAULT_ZIP) -> Optional[int]:
+    """Uncached local_price_cents for the provider loop; Kroger variants are searched at once."""
+    token = await _kroger_tokens.aget()
+    if token:
+        loc = await _kroger_location_for_async(token, postal_code)
+        if loc and name.strip():
+            cents = await first_in_priority(_kroger_variant_cents_async(token, loc, q)
+                                            for q in _kroger_variants(name))
+            if cents is not None:
+                return cents
+    return await _serpapi_shopping_price_cents_async(f"{name} {DEFAULT_CITY}")
+
+# ---------- sync facade ----------
+
+@timed("price_lookup")
+@cached_lookup("price", PRICE_TTL_S)
 def local_price_cents(name: str, postal_code: str = DEFAULT_ZIP) -> Optional[int]:
+    if async_enabled():
+        return run_async(price_for_name_async(name, postal_code))
     token = _kroger_token()
     if token:
-        loc = _kroger_nearest_location(token, postal_code)
+        loc = _kroger_location_for(token, postal_code)
         if loc:
             cents = _kroger_price_cents(token, loc, name)
             if cents is not None:
@@ -0,0 +1,63 @@
+import os
+from io import BytesIO
+from typing import Dict, List, Union
+
+from storage_s3 import upload_fileobj
+
+try:
+    from PIL import Image, ImageOps, features
+    HAS_WEBP = features.check("webp")
+except Exception:
+    Image = None
+    HAS_WEBP = False
+
+THUMB_WIDTHS = sorted({int(w) for w in os.getenv("THUMB_WIDTHS", "320,640,1280").split(",") if w.strip()})
+THUMB_QUALITY = int(os.getenv("THUMB_QUALITY", "80"))
+
+
+def enabled() -> bool:
+    return Image is not None and HAS_WEBP
+
+
+def variant_key(photo_key: str, width: int) -> str:
+    """uploads/abc_box.jpg -> uploads/abc_box__w640.webp (next to the original)."""
+    stem, _ = os.path.splitext(photo_key)
+    return f"{stem}__w{width}.webp"
+
+
+def make_variants(image: Union[bytes, str]) -> Dict[int, bytes]:
+    """
+    WebP renditions of an upload (bytes or a path) at each THUMB_WIDTHS width
+    narrower than the original (EXIF orientation applied). JPEGs are decoded
+    at the smallest scale that still covers the widest variant. Empty when
+    Pillow/WebP is missing.
+    """
+    if not enabled():
+        return {}
+    with Image.open(BytesIO(image) if isinstance(image, bytes) else image) as im:
+        if THUMB_WIDTHS:
+            im.draft("RGB", (THUMB_WIDTHS[-1], THUMB_WIDTHS[-1]))
+        im = ImageOps.exif_transpose(im)
+        if im.mode not in ("RGB", "RGBA"):
+            im = im.convert("RGB")
+        out: Dict[int, bytes] = {}
+        for width in THUMB_WIDTHS:
+            if width >= im.width:
+                break
+            height = max(1, round(im.height * width / im.width))
+            buf = BytesIO()
+            im.resize((width, height), Image.LANCZOS).save(buf, "WEBP", quality=THUMB_QUALITY, method=4)
+            out[width] = buf.getvalue()
+        return out
+
+
+def generate_and_upload(photo_key: str, image: Union[bytes, str]) -> List[int]:
+    """Upload every variant of `image` under variant_key(); returns the widths stored."""
+    widths = []
+    for width, blob in make_variants(image).items():
+        upload_fileobj(BytesIO(blob), variant_key(photo_key, width), extra={
+            "ContentType": "image/webp",
+            "CacheControl": "public, max-age=31536000, immutable",
+        })
+        widths.append(width)
+    return widths
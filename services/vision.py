@@ -1,12 +1,49 @@
-import base64, json, mimetypes, os
-from typing import Dict, List
+import base64, json, logging, mimetypes, os, threading, time
+from io import BytesIO
+from typing import Dict, List, Optional, Tuple, Union
+
+from services.cache import lookup_cache
+from services.hashing import sha256_file, sha256_hex
+from services.metrics import timed
+
+log = logging.getLogger(__name__)
 
 MODEL_DEFAULT = os.getenv("MODEL", "gpt-4o-mini")
+
+# Built on first use: importing openai costs ~0.5 s of worker boot, and the
+# key may only be in the .env that create_app loads.
+client = None
+_client_failed = False
+_client_lock = threading.Lock()
+
+def _get_client():
+    global client, _client_failed
+    if client is None and not _client_failed:
+        with _client_lock:
+            if client is None and not _client_failed:
+                try:
+                    from openai import OpenAI
+                    client = OpenAI()
+                except Exception as e:
+                    log.warning("vision disabled: %s", e)
+                    _client_failed = True
+    return client
+
 try:
-    from openai import OpenAI
-    client = OpenAI()
+    from PIL import Image, ImageOps
 except Exception:
-    client = None
+    Image = None
+
+# The model downsamples large images anyway; sending a 12 MP original only
+# costs upload time and tokens.
+VISION_MAX_DIM = int(os.getenv("VISION_MAX_DIM", "1536"))
+VISION_FORMAT = os.getenv("VISION_FORMAT", "JPEG").upper()  # JPEG or WEBP
+VISION_QUALITY = int(os.getenv("VISION_QUALITY", "85"))
+# Same bytes + same model => same answer; re-uploads skip the model call.
+VISION_CACHE_TTL_S = float(os.getenv("VISION_CACHE_TTL_S", str(90 * 24 * 3600)))
+
+_stats_lock = threading.Lock()
+vision_stats = {"cache_hits": 0, "requests": 0, "bytes_in": 0, "bytes_out": 0, "preprocess_s": 0.0, "model_s": 0.0}
 
 PROMPT = """You are labeling the contents of a garage storage box from one photo.
 Return STRICT JSON only:
@@ -20,17 +57,70 @@ Return STRICT JSON only:
 - If unsure, include lower confidence items instead of omitting everything.
 """
 
-def _encode_image(path: str) -> str:
-    mime = mimetypes.guess_type(path)[0] or "image/jpeg"
-    with open(path, "rb") as f:
-        b64 = base64.b64encode(f.read()).decode("utf-8")
+def preprocess_image(image: Union[bytes, str], mime: str = "image/jpeg") -> Tuple[bytes, str]:
+    """
+    In-memory: apply EXIF orientation, fit within VISION_MAX_DIM and re-encode
+    as VISION_FORMAT. `image` is bytes or a path; JPEGs are decoded straight
+    at a reduced scale, so a large file is never held in full. Returns the
+    original bytes when Pillow is missing, the image can't be decoded, or
+    re-encoding would not make it smaller.
+    """
+    size = len(image) if isinstance(image, bytes) else os.path.getsize(image)
+    out = None
+    if Image is not None:
+        try:
+            with Image.open(BytesIO(image) if isinstance(image, bytes) else image) as im:
+                im.draft("RGB", (VISION_MAX_DIM, VISION_MAX_DIM))
+                im = ImageOps.exif_transpose(im)
+                im.thumbnail((VISION_MAX_DIM, VISION_MAX_DIM), Image.LANCZOS)
+                if im.mode != "RGB":
+                    im = im.convert("RGB")
+                buf = BytesIO()
+                im.save(buf, VISION_FORMAT, quality=VISION_QUALITY)
+                out = buf.getvalue()
+        except Exception:
+            out = None
+    if out is None or len(out) >= size:
+        if not isinstance(image, bytes):
+            with open(image, "rb") as f:
+                image = f.read()
+        return image, mime
+    return out, f"image/{VISION_FORMAT.lower()}"
+
+def _encode_image(data: bytes, mime: str) -> str:
+    b64 = base64.b64encode(data).decode("utf-8")
     return f"data:{mime};base64,{b64}"
 
-def detect_items_json(image_path: str) -> Dict:
-    if not client:
+@timed("vision")
+def detect_items_json(image: Union[bytes, str], mime: Optional[str] = None,
+                      sha256: Optional[str] = None) -> Dict:
+    """
+    `image` is the upload's bytes or a path to it (read at reduced scale).
+    Results are cached by the file's SHA-256 (pass `sha256` if already known).
+    """
+    if isinstance(image, str):
+        mime = mime or mimetypes.guess_type(image)[0]
+        size_in = os.path.getsize(image)
+        sha256 = sha256 or sha256_file(image)
+    else:
+        size_in = len(image)
+        sha256 = sha256 or sha256_hex(image)
+    mime = mime or "image/jpeg"
+    cache_key = f"{MODEL_DEFAULT}|{sha256}"
+    cached = lookup_cache.get("vision", cache_key)
+    if isinstance(cached, dict):
+        with _stats_lock:
+            vision_stats["cache_hits"] += 1
+        return cached
+    openai_client = _get_client()
+    if not openai_client:
         return {"box_name": "Unlabeled Box", "items": [], "notes": "Vision disabled."}
-    data_url = _encode_image(image_path)
-    resp = client.chat.completions.create(
+
+    t0 = time.perf_counter()
+    prepared, prepared_mime = preprocess_image(image, mime)
+    t1 = time.perf_counter()
+    data_url = _encode_image(prepared, prepared_mime)
+    resp = openai_client.chat.completions.create(
         model=MODEL_DEFAULT,
         temperature=0.2,
         response_format={"type": "json_object"},
@@ -42,11 +132,23 @@ def detect_items_json(image_path: str) -> Dict:
             ]},
         ],
     )
+    t2 = time.perf_counter()
+    with _stats_lock:
+        vision_stats["requests"] += 1
+        vision_stats["bytes_in"] += size_in
+        vision_stats["bytes_out"] += len(prepared)
+        vision_stats["preprocess_s"] += t1 - t0
+        vision_stats["model_s"] += t2 - t1
+    log.info("vision: %d -> %d bytes (%.0f%% saved), preprocess %.0f ms, model %.0f ms",
+             size_in, len(prepared), 100.0 * (1 - len(prepared) / max(1, size_in)),
+             (t1 - t0) * 1000, (t2 - t1) * 1000)
     raw = resp.choices[0].message.content.strip()
     try:
         parsed = json.loads(raw)
+        cacheable = True
     except json.JSONDecodeError:
         parsed = {"box_name": "Unlabeled Box", "items": [], "notes": raw[:200]}
+        cacheable = False  # a retry may well parse
     name = (parsed.get("box_name") or "Unlabeled Box").strip()
     items = []
     for it in (parsed.get("items") or []):
@@ -58,4 +160,7 @@ def detect_items_json(image_path: str) -> Dict:
         except Exception:
             c = 0.0
         items.append({"name": n, "confidence": max(0.0, min(1.0, c))})
-    return {"box_name": name, "items": items, "notes": (parsed.get("notes") or "")[:300]}
+    result = {"box_name": name, "items": items, "notes": (parsed.get("notes") or "")[:300]}
+    if cacheable:
+        lookup_cache.set("vision", cache_key, result, VISION_CACHE_TTL_S)
+    return result
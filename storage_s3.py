@@ -1,7 +1,9 @@
 # storage_s3.py
-import os, logging
-import boto3
-from botocore.config import Config
+import os, logging, threading, time
+from collections import OrderedDict
+from typing import Dict, Iterable
+
+from services.metrics import timed
 
 log = logging.getLogger(__name__)
 
@@ -15,31 +17,67 @@ def _clean_env(name: str):
     # remove spaces, quotes, and CR/LF (Windows copy/paste bug)
     return v.strip().strip('"').strip("'").replace("\r", "").replace("\n", "")
 
-AK = _clean_env("AWS_ACCESS_KEY_ID")
-SK = _clean_env("AWS_SECRET_ACCESS_KEY")
-ST = _clean_env("AWS_SESSION_TOKEN")  # may be None
+# Multipart uploads read at most chunk * concurrency bytes at a time from the
+# file object, so pass an open file (not bytes) to keep memory flat.
+S3_MULTIPART_THRESHOLD = int(os.getenv("S3_MULTIPART_THRESHOLD_MB", "8")) * 1024 * 1024
+S3_MULTIPART_CHUNKSIZE = int(os.getenv("S3_MULTIPART_CHUNKSIZE_MB", "8")) * 1024 * 1024
+S3_MAX_CONCURRENCY = int(os.getenv("S3_MAX_CONCURRENCY", "4"))
+STS_TIMEOUT_S = float(os.getenv("STS_TIMEOUT_S", "3"))
 
-_cfg = Config(signature_version="s3v4", s3={"addressing_style": "virtual"})
+# ---- lazy clients ----
+# boto3 is imported and the session/clients built on first use, not at import:
+# worker boot no longer pays for it, and reads credentials after load_dotenv().
+_clients: dict = {}
+_clients_lock = threading.Lock()
 
-# Prefer sanitized explicit env creds if present; otherwise use shared creds profile (which worked in aws_diag.py)
-if AK and SK:
-    _session = boto3.Session(
-        aws_access_key_id=AK,
-        aws_secret_access_key=SK,
-        aws_session_token=ST,
-        region_name=AWS_REGION,
-    )
-    _source = "explicit_env"
-else:
-    _session = boto3.Session(region_name=AWS_REGION)
-    _source = "shared_creds"
+def _aws():
+    if _clients:
+        return _clients
+    with _clients_lock:
+        if _clients:
+            return _clients
+        import boto3
+        from boto3.s3.transfer import TransferConfig
+        from botocore.config import Config
 
-s3  = _session.client("s3", region_name=AWS_REGION, config=_cfg)
-sts = _session.client("sts", region_name=AWS_REGION, config=_cfg)
+        ak, sk = _clean_env("AWS_ACCESS_KEY_ID"), _clean_env("AWS_SECRET_ACCESS_KEY")
+        # Prefer sanitized explicit env creds if present; otherwise use shared creds profile (which worked in aws_diag.py)
+        if ak and sk:
+            session = boto3.Session(
+                aws_access_key_id=ak,
+                aws_secret_access_key=sk,
+                aws_session_token=_clean_env("AWS_SESSION_TOKEN"),  # may be None
+                region_name=AWS_REGION,
+            )
+            source = "explicit_env"
+        else:
+            session = boto3.Session(region_name=AWS_REGION)
+            source = "shared_creds"
+        cfg = Config(signature_version="s3v4", s3={"addressing_style": "virtual"})
+        # only the health check calls STS: fail fast rather than hold a probe
+        sts_cfg = Config(connect_timeout=STS_TIMEOUT_S, read_timeout=STS_TIMEOUT_S,
+                         retries={"max_attempts": 2, "mode": "standard"})
+        _clients.update(
+            session=session,
+            source=source,
+            s3=session.client("s3", region_name=AWS_REGION, config=cfg),
+            sts=session.client("sts", region_name=AWS_REGION, config=sts_cfg),
+            transfer=TransferConfig(
+                multipart_threshold=S3_MULTIPART_THRESHOLD,
+                multipart_chunksize=S3_MULTIPART_CHUNKSIZE,
+                max_concurrency=S3_MAX_CONCURRENCY,
+                use_threads=S3_MAX_CONCURRENCY > 1,
+            ),
+        )
+        return _clients
+
+def _s3():
+    return _aws()["s3"]
 
 def assert_identity():
-    ident = sts.get_caller_identity()
-    c = _session.get_credentials().get_frozen_credentials()
+    aws = _aws()
+    ident = aws["sts"].get_caller_identity()
+    c = aws["session"].get_credentials().get_frozen_credentials()
     log.info(
         "AWS OK: acct=%s arn=%s region=%s key=...%s token=%s source=%s",
         ident.get("Account"),
@@ -47,19 +85,120 @@ def assert_identity():
         AWS_REGION,
         c.access_key[-4:],
         "yes" if c.token else "no",
-        _source,
+        aws["source"],
     )
+    return ident
+
+# ---- identity health ----
+# STS used to be called synchronously in create_app, so an AWS hiccup kept
+# gunicorn from booting. Now it runs in the background and backs /healthz.
+IDENTITY_CHECK_TTL_S = float(os.getenv("IDENTITY_CHECK_TTL_S", "300"))
 
+_identity = {"ok": None, "account": None, "error": None, "checked_at": None}
+_identity_lock = threading.Lock()  # guards _identity
+_refresh_lock = threading.Lock()   # held by the one thread talking to STS
+
+def check_identity(max_age_s: float = IDENTITY_CHECK_TTL_S, wait: bool = True) -> dict:
+    """
+    Last identity check result, re-running STS if it is older than max_age_s
+    (in a background thread when wait=False). Never waits on a refresh that is
+    already running: callers get the previous result meanwhile (ok=None until
+    the first check finishes).
+    """
+    with _identity_lock:
+        last = dict(_identity)
+    if last["checked_at"] and time.time() - last["checked_at"] < max_age_s:
+        return last
+    if not wait:
+        if not _refresh_lock.locked():
+            check_identity_in_background(max_age_s)
+        return last
+    if not _refresh_lock.acquire(blocking=False):
+        return last
+    try:
+        try:
+            ident = assert_identity()
+            result = {"ok": True, "account": ident.get("Account"), "error": None}
+        except Exception as e:
+            log.warning("AWS identity check failed: %s", e)
+            result = {"ok": False, "error": f"{type(e).__name__}: {e}"}
+        with _identity_lock:
+            _identity.update(result, checked_at=time.time())
+            return dict(_identity)
+    finally:
+        _refresh_lock.release()
+
+def check_identity_in_background(max_age_s: float = IDENTITY_CHECK_TTL_S) -> None:
+    threading.Thread(target=check_identity, args=(max_age_s,), name="aws-identity", daemon=True).start()
+
+@timed("s3.upload")
 def upload_fileobj(fileobj, key: str, extra: dict | None = None):
     key = (key or "").strip().lstrip("/")
     extra = extra or {}
     extra.setdefault("ContentType", "application/octet-stream")
-    s3.upload_fileobj(fileobj, S3_BUCKET, key, ExtraArgs=extra)
+    _s3().upload_fileobj(fileobj, S3_BUCKET, key, ExtraArgs=extra, Config=_aws()["transfer"])
     return key  # store key; presign when rendering
 
+@timed("s3.head")
+def object_exists(key: str) -> bool:
+    """HEAD the object; lets content-addressed uploads skip a PUT of bytes S3 already has."""
+    try:
+        _s3().head_object(Bucket=S3_BUCKET, Key=key)
+        return True
+    except _s3().exceptions.ClientError as e:
+        if e.response.get("Error", {}).get("Code") in ("404", "NoSuchKey", "NotFound"):
+            return False
+        raise
+
+@timed("s3.download")
+def download_bytes(key: str) -> bytes:
+    obj = _s3().get_object(Bucket=S3_BUCKET, Key=key)
+    return obj["Body"].read()
+
+# ---- presign cache ----
+# A fresh presign embeds the signing time, so every render used to produce a
+# new URL and browsers never reused cached image bytes. Within a time bucket
+# of expires/2 the same key maps to the same URL; a URL handed out at the end
+# of its bucket is therefore still valid for at least expires/2.
+PRESIGN_CACHE_SIZE = int(os.getenv("PRESIGN_CACHE_SIZE", "10000"))
+
+_presign_cache: "OrderedDict[tuple, str]" = OrderedDict()
+_presign_lock = threading.Lock()
+presign_stats = {"hits": 0, "misses": 0, "evictions": 0}
+
+def presign_window(expires=3600) -> int:
+    """Current time bucket; presigned URLs for a key only change when it does."""
+    return int(time.time() // max(60, int(expires) // 2))
+
+def _presign_cache_key(key: str, expires: int) -> tuple:
+    return (key, int(expires), presign_window(expires))
+
+@timed("s3.presign")
 def presigned_url(key: str, expires=3600) -> str:
-    return s3.generate_presigned_url(
+    ck = _presign_cache_key(key, expires)
+    with _presign_lock:
+        url = _presign_cache.get(ck)
+        if url is not None:
+            _presign_cache.move_to_end(ck)
+            presign_stats["hits"] += 1
+            return url
+        presign_stats["misses"] += 1
+    url = _s3().generate_presigned_url(
         "get_object",
         Params={"Bucket": S3_BUCKET, "Key": key},
         ExpiresIn=expires,
     )
+    with _presign_lock:
+        _presign_cache[ck] = url
+        while len(_presign_cache) > PRESIGN_CACHE_SIZE:
+            _presign_cache.popitem(last=False)
+            presign_stats["evictions"] += 1
+    return url
+
+def presigned_urls(keys: Iterable[str], expires=3600) -> Dict[str, str]:
+    """Batch presign for list views; each distinct key is signed at most once."""
+    return {k: presigned_url(k, expires) for k in dict.fromkeys(k for k in keys if k)}
+
+def presign_cache_stats() -> dict:
+    with _presign_lock:
+        return dict(presign_stats, entries=len(_presign_cache))
@@ -0,0 +1,7 @@
+import os, sys, tempfile
+from pathlib import Path
+
+# db.connection reads SQLITE_PATH at import: point it at a throwaway DB first
+os.environ["SQLITE_PATH"] = os.path.join(tempfile.mkdtemp(prefix="inventoryiq-test-"), "test.sqlite3")
+os.environ.setdefault("JOB_WORKERS", "0")
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
@@ -0,0 +1,48 @@
+import pytest
+
+from db.queries import decode_cursor, encode_cursor, list_boxes, search_items
+from db.schema import run_migrations
+
+
+@pytest.fixture(autouse=True)
+def schema():
+    run_migrations()
+
+
+def test_round_trip():
+    assert decode_cursor(encode_cursor("s", -1.5, 42), str, (int, float), int) == ["s", -1.5, 42]
+    assert decode_cursor(encode_cursor(7), int) == [7]
+
+
+@pytest.mark.parametrize("cursor", [
+    "not base64 !",
+    encode_cursor(),
+    encode_cursor({}),        # W3t9XQ: well-formed, wrong type
+    encode_cursor("7"),
+    encode_cursor(True),
+    encode_cursor(1.5),
+    encode_cursor(1, 2),
+])
+def test_list_boxes_rejects_bad_cursors(cursor):
+    with pytest.raises(ValueError):
+        list_boxes(cursor=cursor)
+
+
+@pytest.mark.parametrize("q, cursor", [
+    ("pot", encode_cursor("s", {}, 1)),
+    ("pot", encode_cursor("s", 1.0)),
+    ("pot", encode_cursor("s", 1.0, "1")),
+    ("pot", encode_cursor("s", None, 1)),
+    ("pot", encode_cursor("x", 1.0, 1)),
+    ("pot", encode_cursor(7)),
+    ("", encode_cursor("s", 1.0, 1)),   # the recent-items page only issues "c" cursors
+])
+def test_search_items_rejects_bad_cursors(q, cursor):
+    with pytest.raises(ValueError):
+        search_items(q, cursor=cursor)
+
+
+def test_valid_cursors_are_accepted():
+    assert list_boxes(cursor=encode_cursor(10)) == ([], None)
+    assert search_items("pot", cursor=encode_cursor("s", -1.0, 10)) == ([], None)
+    assert search_items("", cursor=encode_cursor("c", 0.5, 10)) == ([], None)
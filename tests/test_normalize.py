@@ -0,0 +1,50 @@
+import pytest
+
+from db.schema import DEFAULT_ITEM_ALIASES
+from services.normalize import NameMatcher, basic_form, merge_duplicates
+
+
+@pytest.fixture
+def matcher():
+    return NameMatcher(dict(DEFAULT_ITEM_ALIASES))
+
+
+@pytest.mark.parametrize("word, singular", [
+    ("pots", "pot"), ("batteries", "battery"), ("pies", "pie"), ("cookies", "cookie"),
+    ("caches", "cache"), ("benches", "bench"), ("boxes", "box"), ("sizes", "size"),
+    ("dresses", "dress"), ("knives", "knife"), ("glasses", "glasses"), ("xmas", "xmas"),
+])
+def test_basic_form_singularizes(word, singular):
+    assert basic_form(word) == singular
+
+
+def test_basic_form_folds_case_punctuation_and_every_word():
+    assert basic_form("  Books--Shelves ") == "book shelf"
+
+
+@pytest.mark.parametrize("name, canonical", [
+    ("Xmas", "christmas"),
+    ("Xmas Lights", "christmas light"),
+    ("xmas tree", "christmas tree"),
+    ("Stainless-Steel POTS", "steel pot"),
+    ("stainless pot", "steel pot"),
+    ("Torches", "flashlight"),
+    ("Flash Lights", "flashlight"),
+    ("Extension cables", "extension cord"),
+    ("power cords", "extension cord"),
+    ("hammer", "hammer"),
+])
+def test_starter_aliases(matcher, name, canonical):
+    assert matcher.canonical(name) == canonical
+
+
+def test_alias_keys_fold_like_names():
+    m = NameMatcher({"Xmas": "Christmas", "Paint Brushes": "brush"})
+    assert m.canonical("xmas lights") == "christmas light"
+    assert m.canonical("old paint brush") == "old brush"
+
+
+def test_merge_duplicates_keeps_most_confident_spelling(monkeypatch, matcher):
+    monkeypatch.setattr("services.normalize.get_matcher", lambda: matcher)
+    merged = merge_duplicates([("Xmas Lights", 0.4), ("christmas light", 0.9), ("Hammer", 0.5)])
+    assert merged == [("christmas light", 0.9), ("Hammer", 0.5)]
@@ -0,0 +1,7 @@
+from db.schema import check_query_plans, run_migrations
+
+
+def test_hot_queries_use_indexes():
+    # a migration that drops or changes one of the hot-path indexes fails here
+    run_migrations()
+    assert check_query_plans() == []